@@ -0,0 +1,92 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import (BasicAuthentication,
+                                           TokenAuthentication)
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import SimpleRateThrottle
+
+from users.cache import token_cache_key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication со снимком пользователя в кэше.
+
+    Запрос с токеном стоит одного обращения к кэшу вместо
+    SELECT authtoken_token JOIN users_user. Снимок сбрасывают сигналы
+    users.signals: удаление токена, смена пароля, деактивация.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        user = cache.get(cache_key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, user, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            return user, token
+        return user, Token(key=key, user=user)
+
+
+class BasicAuthThrottle(SimpleRateThrottle):
+    """Попытки Basic-аутентификации с одного адреса.
+
+    Адрес берётся с учётом NUM_PROXIES, так что подменой
+    X-Forwarded-For лимит не обойти.
+    """
+    scope = 'basic_auth'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
+
+
+class BasicAuthFailureThrottle(SimpleRateThrottle):
+    """Неудачные попытки Basic-аутентификации для одного имени.
+
+    Перебор пароля с разных адресов упирается в этот лимит. Удачные
+    входы не записываются: лимит не мешает клиентам с верным паролем.
+    """
+    scope = 'basic_auth_failures'
+
+    def __init__(self, userid):
+        self.userid = userid
+        super().__init__()
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': hashlib.sha256(
+                self.userid.casefold().encode()).hexdigest(),
+        }
+
+    def throttle_success(self):
+        return True
+
+    def failed(self):
+        self.history.insert(0, self.now)
+        self.cache.set(self.key, self.history, self.duration)
+
+
+class ThrottledBasicAuthentication(BasicAuthentication):
+    """BasicAuthentication с ограничением частоты проверок пароля.
+
+    Каждая проверка — это полный PBKDF2, поэтому число попыток с
+    адреса ограничено ставкой 'basic_auth', а неудачных попыток для
+    одного имени — ставкой 'basic_auth_failures'.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        failures = BasicAuthFailureThrottle(userid)
+        for throttle in (BasicAuthThrottle(), failures):
+            if not throttle.allow_request(request, None):
+                raise exceptions.Throttled(throttle.wait())
+        try:
+            return super().authenticate_credentials(
+                userid, password, request)
+        except exceptions.AuthenticationFailed:
+            failures.failed()
+            raise
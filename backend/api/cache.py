@@ -0,0 +1,184 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.connection import ConnectionProxy
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.cache import USER_KEY, get_generations, get_versions
+
+# Ответы анонимам и фрагменты рецептов: в памяти процесса, их ключи
+# включают общие версии из кэша default. Прокси, как django.core.cache:
+# override_settings(CACHES=...) в тестах действует и на него.
+local_cache = ConnectionProxy(caches, 'local')
+
+
+class ConditionalGetMixin:
+    """ETag и Cache-Control для list/retrieve.
+
+    ETag строится из ключей-версий в кэше, поэтому If-None-Match
+    проверяется до запросов к БД и сериализатора: ответ 304 не стоит ни
+    одного запроса. Last-Modified не отдаётся: версии — непрозрачные
+    счётчики, а до секунд HTTP-даты два изменения за секунду неразличимы.
+    """
+    cache_control = 'public, no-cache'
+    vary_headers = ('Accept',)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_versions(self, request):
+        raise NotImplementedError
+
+    def get_cache_control(self, request):
+        return self.cache_control
+
+    def get_etag_parts(self, request, versions):
+        return [request.accepted_renderer.format, *versions]
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        versions = self.get_versions(request)
+        raw = '|'.join(map(str, self.get_etag_parts(request, versions)))
+        etag = f'"{hashlib.md5(raw.encode()).hexdigest()}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Cache-Control'] = self.get_cache_control(request)
+        patch_vary_headers(response, self.vary_headers)
+        return response
+
+
+class RecipeConditionalGetMixin(ConditionalGetMixin):
+    """Версии рецептов: поколения кэша и, для пользователя, его связи."""
+    vary_headers = ('Accept', 'Authorization')
+
+    def get_versions(self, request):
+        tags = request.query_params.getlist('tags')
+        versions = get_generations(tags if self.action == 'list' else ())
+        if request.user.is_authenticated:
+            versions += get_versions([USER_KEY.format(request.user.pk)])
+        return versions
+
+    def get_cache_control(self, request):
+        if request.user.is_authenticated:
+            return 'private, no-cache'
+        return self.cache_control
+
+    def get_etag_parts(self, request, versions):
+        return [request.user.pk, *super().get_etag_parts(request, versions)]
+
+
+class AnonymousResponseCacheMixin:
+    """Кэш ответов list/retrieve для анонимных пользователей.
+
+    Ключ — путь, хост и нормализованные query-параметры плюс поколения
+    кэша рецептов, которые сигналы меняют при изменении данных.
+    Пересчёт промаха выполняет один запрос процесса, остальные ждут его
+    результат.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    @staticmethod
+    def response_cache_key(request):
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        generations = get_generations(request.query_params.getlist('tags'))
+        raw = f'{request.get_host()}|{request.path}|{params}|{generations}'
+        return 'recipes:response:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.response_cache_key(request)
+        lock = f'{key}:lock'
+        locked = False
+        data = local_cache.get(key)
+        if data is None:
+            locked = local_cache.add(
+                lock, True, settings.RECIPES_CACHE_LOCK_TIMEOUT)
+            if not locked:
+                data = self.wait_for(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                local_cache.set(
+                    key, response.data, settings.RECIPES_CACHE_TIMEOUT)
+        finally:
+            if locked:
+                local_cache.delete(lock)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    @staticmethod
+    def wait_for(key):
+        """Дождаться результата, который считает другой запрос."""
+        deadline = time.monotonic() + settings.RECIPES_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(settings.RECIPES_CACHE_POLL_INTERVAL)
+            data = local_cache.get(key)
+            if data is not None:
+                return data
+        return None
+
+
+FRAGMENT_HITS_KEY = 'recipes:fragment:hits'
+FRAGMENT_MISSES_KEY = 'recipes:fragment:misses'
+
+
+def fragment_key(recipe, request, epoch):
+    """Ключ независимой от пользователя части рецепта.
+
+    Меняется вместе с recipe.update, профилем автора, эпохой кэша
+    (теги, ингредиенты) и хостом (абсолютный URL картинки).
+    """
+    author = recipe.author
+    raw = (
+        f'{recipe.pk}|{recipe.update.isoformat()}|{author.pk}|'
+        f'{author.email}|{author.username}|{author.first_name}|'
+        f'{author.last_name}|{epoch}|{request.get_host()}'
+    )
+    return 'recipes:fragment:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def count_fragments(hits, misses):
+    """Счётчики попаданий и промахов кэша фрагментов в этом процессе."""
+    for key, value in ((FRAGMENT_HITS_KEY, hits),
+                       (FRAGMENT_MISSES_KEY, misses)):
+        if value:
+            local_cache.add(key, 0, None)
+            try:
+                local_cache.incr(key, value)
+            except ValueError:
+                local_cache.set(key, value, None)
+
+
+def fragment_stats():
+    stats = local_cache.get_many([FRAGMENT_HITS_KEY, FRAGMENT_MISSES_KEY])
+    return {
+        'hits': stats.get(FRAGMENT_HITS_KEY, 0),
+        'misses': stats.get(FRAGMENT_MISSES_KEY, 0),
+    }
@@ -0,0 +1,52 @@
+from django.core.exceptions import ValidationError
+from rest_framework.relations import (MANY_RELATION_KWARGS, ManyRelatedField,
+                                      PrimaryKeyRelatedField)
+
+
+class BulkManyRelatedField(ManyRelatedField):
+    """Список первичных ключей, проверяемый одним запросом id__in."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.to_internal_value_bulk(data)
+
+
+class BulkPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который с many=True не делает SELECT на
+    каждый элемент, а сообщает обо всех отсутствующих id одной ошибкой.
+    """
+    default_error_messages = {
+        'does_not_exist_many': 'Объекты не существуют: {pk_values}.',
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_internal_value_bulk(self, data):
+        """Объекты в порядке data (с повторами) за один запрос."""
+        queryset = self.get_queryset()
+        pk = queryset.model._meta.pk
+        pks = []
+        for value in data:
+            if self.pk_field is not None:
+                value = self.pk_field.to_internal_value(value)
+            if isinstance(value, (bool, list, dict)):
+                self.fail('incorrect_type', data_type=type(value).__name__)
+            try:
+                pks.append(pk.to_python(value))
+            except ValidationError:
+                self.fail('incorrect_type', data_type=type(value).__name__)
+        objects = queryset.in_bulk(set(pks))
+        missing = sorted({value for value in pks if value not in objects})
+        if missing:
+            self.fail('does_not_exist_many',
+                      pk_values=', '.join(map(str, missing)))
+        return [objects[value] for value in pks]
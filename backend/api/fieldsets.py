@@ -0,0 +1,118 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+class SparseFieldsMixin:
+    """Оставляет в сериализаторе только поля из выборки ?fields=/?omit=.
+
+    Выборка корневого сериализатора лежит в context['fields'],
+    вложенным сериализаторам она передаётся атрибутом selection.
+    """
+
+    def get_selection(self):
+        if hasattr(self, 'selection'):
+            return self.selection
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        if parent is None:
+            return self.context.get('fields')
+        return None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.get_selection()
+        if selection is None:
+            return fields
+        for name in list(fields):
+            if name not in selection:
+                del fields[name]
+            elif selection[name] is not None:
+                field = fields[name]
+                getattr(field, 'child', field).selection = selection[name]
+        return fields
+
+
+def available_fields(serializer_class):
+    """Поля сериализатора; для вложенных с выборкой — их поля."""
+    available = {}
+    for name in serializer_class.Meta.fields:
+        field = serializer_class._declared_fields.get(name)
+        nested = getattr(field, 'child', field)
+        available[name] = (
+            nested.Meta.fields
+            if isinstance(nested, SparseFieldsMixin) else None
+        )
+    return available
+
+
+def split_param(request, param):
+    value = request.query_params.get(param, '')
+    return [path.strip() for path in value.split(',') if path.strip()]
+
+
+def check_paths(paths, available):
+    unknown = []
+    for path in paths:
+        name, _, nested = path.partition('.')
+        if name not in available or nested and (
+                available[name] is None or nested not in available[name]):
+            unknown.append(path)
+    if unknown:
+        raise ValidationError(
+            {FIELDS_PARAM: f'Неизвестные поля: {", ".join(unknown)}.'})
+
+
+def parse_selection(request, serializer_class):
+    """Выборка полей из ?fields= и ?omit=.
+
+    Возвращает None без параметров, иначе словарь поле -> None (всё
+    поле) или такой же словарь для вложенного сериализатора, например
+    ?fields=id,author.username -> {'id': None, 'author': {'username': None}}.
+    """
+    fields = split_param(request, FIELDS_PARAM)
+    omit = split_param(request, OMIT_PARAM)
+    if not fields and not omit:
+        return None
+    available = available_fields(serializer_class)
+    check_paths(fields + omit, available)
+    if fields:
+        selection = {}
+        for path in fields:
+            name, _, nested = path.partition('.')
+            if not nested:
+                selection[name] = None
+            elif selection.get(name, {}) is not None:
+                selection.setdefault(name, {})[nested] = None
+    else:
+        selection = dict.fromkeys(available)
+    for path in omit:
+        name, _, nested = path.partition('.')
+        if not nested:
+            selection.pop(name, None)
+        elif name in selection:
+            if selection[name] is None:
+                selection[name] = dict.fromkeys(available[name])
+            selection[name].pop(nested, None)
+    return selection
+
+
+class SparseFieldsViewMixin:
+    """Выборка полей для действий из sparse_actions в контексте."""
+    sparse_actions = ('list', 'retrieve')
+
+    def get_field_selection(self):
+        if self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_field_selection'):
+            self._field_selection = parse_selection(
+                self.request, self.get_serializer_class())
+        return self._field_selection
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_field_selection()
+        return context
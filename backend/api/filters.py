@@ -1,8 +1,7 @@
 from django_filters import ModelMultipleChoiceFilter
 from django_filters.rest_framework import FilterSet, BooleanFilter
-from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Recipe, Tag
 
 
 class RecipeFilter(FilterSet):
@@ -32,7 +31,7 @@ class RecipeFilter(FilterSet):
             return queryset.filter(
                 recipes_favorite_related__user=user,
             )
-        return Recipe.objects.all()
+        return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
@@ -40,12 +39,4 @@ class RecipeFilter(FilterSet):
             return queryset.filter(
                 recipes_shoppingcart_related__user=user,
             )
-        return Recipe.objects.all()
-
-
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+        return queryset
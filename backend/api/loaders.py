@@ -0,0 +1,48 @@
+from recipes.models import Favorite, ShoppingCart, Subscribe
+
+# Модель связи -> поле с id объекта, на который ссылается пользователь.
+RELATIONS = {
+    Subscribe: 'author_id',
+    Favorite: 'recipe_id',
+    ShoppingCart: 'recipe_id',
+}
+
+
+class RelationSets:
+    """Id подписок, избранного и корзины текущего пользователя.
+
+    Каждое множество читается одним запросом при первом обращении и
+    живёт до конца запроса; изменения в этом же запросе вносятся через
+    add() и discard().
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.sets = {}
+
+    def get(self, model):
+        if model not in self.sets:
+            if self.user.is_authenticated:
+                self.sets[model] = set(model.objects.filter(
+                    user=self.user).values_list(RELATIONS[model], flat=True))
+            else:
+                self.sets[model] = set()
+        return self.sets[model]
+
+    def contains(self, model, pk):
+        return pk in self.get(model)
+
+    def add(self, model, pk):
+        if model in self.sets:
+            self.sets[model].add(pk)
+
+    def discard(self, model, pk):
+        if model in self.sets:
+            self.sets[model].discard(pk)
+
+
+def get_relation_sets(request):
+    """RelationSets, привязанный к запросу."""
+    if not hasattr(request, 'relation_sets'):
+        request.relation_sets = RelationSets(request.user)
+    return request.relation_sets
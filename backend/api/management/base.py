@@ -0,0 +1,136 @@
+import json
+import os
+from csv import reader
+from itertools import islice
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+
+DATA_PATH = os.path.join(settings.BASE_DIR, 'data')
+
+
+def batches(iterable, size):
+    """Разбить итерируемое на списки по size элементов."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class CatalogImportCommand(BaseCommand):
+    """Базовая команда импорта справочника из .csv/.json.
+
+    Без --sync строки вставляются пачками через bulk_create с
+    ignore_conflicts по уникальным ограничениям модели. С --sync
+    справочник в базе приводится к файлу: новые строки добавляются,
+    изменённые обновляются, отсутствующие в файле удаляются, если на
+    них ничего не ссылается.
+    """
+    model = None
+    fields = ()
+    key_fields = ()
+    relation = None
+    data_file = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=os.path.join(DATA_PATH, self.data_file),
+            help='Путь к .csv или .json файлу.'
+        )
+        parser.add_argument(
+            '--sync', action='store_true',
+            help='Синхронизировать справочник с файлом и вывести отчёт.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только отчёт о расхождениях, без записи (для --sync).'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def read_rows(self, path):
+        """Построчно читать файл, отдавая словари полей модели."""
+        with open(path, 'r', encoding='UTF-8') as data:
+            if path.endswith('.json'):
+                for item in json.load(data):
+                    yield {field: item[field] for field in self.fields}
+                return
+            for row in reader(data):
+                if len(row) == len(self.fields):
+                    yield dict(zip(self.fields, row))
+
+    def changed(self):
+        """Вызывается после записи: bulk_create не шлёт сигналы."""
+
+    def key(self, values):
+        return tuple(values[field] for field in self.key_fields)
+
+    def handle(self, *args, **options):
+        rows = self.read_rows(options['file'])
+        if options['sync']:
+            self.sync(rows, options['batch_size'], options['dry_run'])
+        else:
+            self.upsert(rows, options['batch_size'])
+
+    def upsert(self, rows, batch_size):
+        before = self.model.objects.count()
+        for batch in batches(rows, batch_size):
+            self.model.objects.bulk_create(
+                [self.model(**values) for values in batch],
+                ignore_conflicts=True
+            )
+        added = self.model.objects.count() - before
+        self.stdout.write(f'{self.model._meta.label}: добавлено {added}')
+        self.changed()
+
+    def sync(self, rows, batch_size, dry_run):
+        incoming = {self.key(values): values for values in rows}
+        existing = {
+            self.key(vars(obj)): obj
+            for obj in self.model.objects.only(*self.fields)
+        }
+        to_create = [
+            self.model(**values)
+            for key, values in incoming.items() if key not in existing
+        ]
+        update_fields = [
+            field for field in self.fields if field not in self.key_fields
+        ]
+        to_update = []
+        for key, obj in existing.items():
+            values = incoming.get(key)
+            if values is None:
+                continue
+            changed = [
+                field for field in update_fields
+                if getattr(obj, field) != values[field]
+            ]
+            for field in changed:
+                setattr(obj, field, values[field])
+            if changed:
+                to_update.append(obj)
+        stale = [
+            obj.pk for key, obj in existing.items() if key not in incoming
+        ]
+        referenced = set(self.model.objects.filter(
+            pk__in=stale, **{f'{self.relation}__isnull': False}
+        ).values_list('pk', flat=True))
+        to_delete = [pk for pk in stale if pk not in referenced]
+
+        self.stdout.write(
+            f'{self.model._meta.label}: добавить {len(to_create)}, '
+            f'обновить {len(to_update)}, удалить {len(to_delete)}, '
+            f'оставить используемые {len(referenced)}'
+        )
+        if dry_run:
+            return
+        with transaction.atomic():
+            self.model.objects.bulk_create(to_create, batch_size=batch_size)
+            if to_update:
+                self.model.objects.bulk_update(
+                    to_update, update_fields, batch_size=batch_size)
+            for batch in batches(to_delete, batch_size):
+                self.model.objects.filter(pk__in=batch).delete()
+        self.changed()
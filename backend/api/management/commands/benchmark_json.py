@@ -0,0 +1,62 @@
+import io
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeReadSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Сравнить JSONRenderer/JSONParser с FastJSONRenderer/FastJSONParser."""
+
+    help = 'Время и размер рендера страницы рецептов в JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        recipes = Recipe.objects.for_read(request.user).order_by(
+            '-pub_date', '-id')[:options['recipes']]
+        data = RecipeReadSerializer(
+            recipes, many=True, context={'request': request}).data
+        if not data:
+            raise CommandError('Нет рецептов: загрузите seed_scale.')
+        self.stdout.write(f'Рецептов на странице: {len(data)}')
+        reference = JSONRenderer().render(data)
+        for renderer, parser in ((JSONRenderer(), JSONParser()),
+                                 (FastJSONRenderer(), FastJSONParser())):
+            body = renderer.render(data)
+            if body != reference:
+                raise CommandError(
+                    f'{type(renderer).__name__}: вывод отличается.')
+            render_time = self.measure(
+                lambda: renderer.render(data), options['repeat'])
+            parse_time = self.measure(
+                lambda: parser.parse(io.BytesIO(body)), options['repeat'])
+            self.stdout.write(
+                f'{type(renderer).__name__}: {len(body)} байт, '
+                f'рендер {render_time:.3f} мс, '
+                f'разбор {parse_time:.3f} мс'
+            )
+
+    @staticmethod
+    def measure(func, repeat):
+        """Лучшее из пяти средних времён, в миллисекундах."""
+        best = float('inf')
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func()
+            best = min(best, (time.perf_counter() - start) / repeat)
+        return best * 1000
@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand
+
+from recipes.images import build_variants
+from recipes.jobs import build_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Построить уменьшенные копии для уже загруженных картинок."""
+
+    help = 'Сделать WebP/JPEG-копии картинок рецептов, у которых их нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересобрать копии у всех рецептов.')
+        parser.add_argument('--now', action='store_true',
+                            help='Строить здесь, а не через очередь задач.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).only('image', 'image_variants').order_by('pk')
+        pks = [
+            recipe.pk for recipe in recipes.iterator()
+            if options['all']
+            or recipe.image_variants.get('source') != recipe.image.name
+        ]
+        for done, pk in enumerate(pks, start=1):
+            if not options['now']:
+                # Ниже приоритета новых загрузок, чтобы не задерживать их.
+                build_image_variants.enqueue(priority=0, recipe_id=pk)
+                continue
+            try:
+                build_variants(pk)
+            except Exception as error:
+                self.stderr.write(f'Рецепт {pk}: {error}')
+            if done % 100 == 0:
+                self.stdout.write(f'{done}/{len(pks)}')
+        self.stdout.write(f'Обработано рецептов: {len(pks)}')
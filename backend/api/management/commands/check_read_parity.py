@@ -0,0 +1,59 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+
+from api.management.base import batches
+from api.serializers import RecipeReadSerializer
+from recipes.models import Favorite, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Сверить represent_fast с полями DRF на всех рецептах."""
+
+    help = (
+        'Сравнить JSON рецептов из RecipeReadSerializer.represent_fast '
+        'и обычной сериализации DRF байт в байт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=3,
+            help='Сколько пользователей проверить кроме анонимного.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Пользователи с избранным, чтобы флаги были не только False.
+        users = [AnonymousUser()] + list(User.objects.filter(
+            pk__in=Favorite.objects.values('user')
+        ).order_by('pk')[:options['users']])
+        renderer = JSONRenderer()
+        mismatches = 0
+        for user in users:
+            request = Request(APIRequestFactory().get('/api/recipes/'))
+            request.user = user
+            serializer = RecipeReadSerializer(context={'request': request})
+            checked = 0
+            pks = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+            for batch in batches(pks.iterator(), options['batch_size']):
+                for recipe in Recipe.objects.for_read(user).filter(
+                        pk__in=batch):
+                    if hasattr(recipe, 'author_is_subscribed'):
+                        recipe.author.is_subscribed = (
+                            recipe.author_is_subscribed)
+                    fast = renderer.render(serializer.represent_fast(recipe))
+                    slow = renderer.render(
+                        ModelSerializer.to_representation(serializer, recipe))
+                    checked += 1
+                    if fast != slow:
+                        mismatches += 1
+                        self.stderr.write(
+                            f'Рецепт {recipe.pk}, пользователь {user}:\n'
+                            f'{fast.decode()}\n{slow.decode()}')
+            self.stdout.write(f'{user}: проверено рецептов {checked}')
+        if mismatches:
+            raise CommandError(f'Расхождений: {mismatches}.')
+        self.stdout.write(self.style.SUCCESS('Вывод совпадает.'))
@@ -1,24 +1,17 @@
-import os
-from csv import reader
-
-from django.conf import settings
-from django.core.management import BaseCommand
-
+from api.management.base import CatalogImportCommand
+from recipes.cache import bump_epoch
 from recipes.models import Ingredient
-
-DATA_PATH = os.path.join(settings.BASE_DIR, 'data')
-INGREDIENTS_DATA = os.path.join(DATA_PATH, 'ingredients.csv')
+from recipes.search import invalidate_ingredient_index
 
 
-class Command(BaseCommand):
-    """Импорт ингредиентов из .csv."""
+class Command(CatalogImportCommand):
+    """Импорт ингредиентов из .csv/.json."""
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    key_fields = ('name', 'measurement_unit')
+    relation = 'recipe_ingredients'
+    data_file = 'ingredients.csv'
 
-    def handle(self, *args, **kwargs):
-        with open(INGREDIENTS_DATA, 'r', encoding='UTF-8') as ingredients:
-            for row in reader(ingredients):
-                if len(row) == 2:
-                    name, measurement_unit = row
-                    Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit,
-                    )
+    def changed(self):
+        invalidate_ingredient_index()
+        bump_epoch()
@@ -1,25 +1,16 @@
-import os
-from csv import reader
-
-from django.conf import settings
-from django.core.management import BaseCommand
-
+from api.management.base import CatalogImportCommand
+from recipes.cache import TAGS_VERSION_KEY, bump_epoch, bump_version
 from recipes.models import Tag
 
-DATA_PATH = os.path.join(settings.BASE_DIR, 'data')
-TAGS_DATA = os.path.join(DATA_PATH, 'tags.csv')
-
 
-class Command(BaseCommand):
+class Command(CatalogImportCommand):
     """Импорт тегов из .csv."""
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    key_fields = ('slug',)
+    relation = 'recipe'
+    data_file = 'tags.csv'
 
-    def handle(self, *args, **kwargs):
-        with open(TAGS_DATA, 'r', encoding='UTF-8') as tags:
-            for row in reader(tags):
-                if len(row) == 3:
-                    name, color, slug = row
-                    Tag.objects.get_or_create(
-                        name=name,
-                        color=color,
-                        slug=slug
-                    )
+    def changed(self):
+        bump_version(TAGS_VERSION_KEY)
+        bump_epoch()
@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscribe
+from users.models import User
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscribe, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+)
+
+
+class Command(BaseCommand):
+    """Пересчитать денормализованные счётчики пользователей и рецептов."""
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            for model, field, related, relation in COUNTERS:
+                count = related.objects.filter(
+                    **{relation: OuterRef('pk')}
+                ).order_by().values(relation).annotate(
+                    count=Count('pk')).values('count')
+                updated = model.objects.update(
+                    **{field: Coalesce(Subquery(count), Value(0))})
+                self.stdout.write(
+                    f'{model._meta.label}.{field}: {updated} строк')
@@ -0,0 +1,56 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+
+from api.management.base import batches
+from recipes.models import IngredientInRecipe, ShoppingListItem
+
+
+class Command(BaseCommand):
+    """Сверить сводные списки покупок с корзинами и исправить расхождения."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только отчёт о расхождениях, без записи.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        expected = {
+            (item['user_id'], item['ingredient_id']): item['amount']
+            for item in IngredientInRecipe.objects.filter(
+                recipe__recipes_shoppingcart_related__isnull=False
+            ).values(
+                user_id=F('recipe__recipes_shoppingcart_related__user'),
+                ingredient_id=F('ingredients'),
+            ).annotate(amount=Sum('amount')).order_by()
+        }
+        to_update = []
+        to_delete = []
+        for item in ShoppingListItem.objects.all().iterator():
+            amount = expected.pop((item.user_id, item.ingredient_id), None)
+            if amount is None:
+                to_delete.append(item.pk)
+            elif amount != item.amount:
+                item.amount = amount
+                to_update.append(item)
+        to_create = [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+            for (user_id, ingredient_id), amount in expected.items()
+        ]
+        self.stdout.write(
+            f'Списки покупок: добавить {len(to_create)}, '
+            f'исправить {len(to_update)}, удалить {len(to_delete)}'
+        )
+        if options['dry_run']:
+            return
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            ShoppingListItem.objects.bulk_create(
+                to_create, batch_size=batch_size)
+            ShoppingListItem.objects.bulk_update(
+                to_update, ['amount'], batch_size=batch_size)
+            for batch in batches(to_delete, batch_size):
+                ShoppingListItem.objects.filter(pk__in=batch).delete()
@@ -0,0 +1,47 @@
+import signal
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from jobs.queue import claim, release_stale, run
+
+
+class Command(BaseCommand):
+    """Воркер очереди задач jobs.Job."""
+
+    help = 'Выполнять фоновые задачи из очереди в базе данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти.')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Пауза, когда очередь пуста (секунды).')
+        parser.add_argument('--max-jobs', type=int, default=0,
+                            help='Выйти после N задач (0 — без предела).')
+        parser.add_argument('--name', action='append', dest='names',
+                            help='Брать только задачи с этим именем.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        done = 0
+        while not self.stopping:
+            close_old_connections()
+            claimed = claim(options['names'])
+            if claimed is None:
+                release_stale()
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            status = run(claimed)
+            self.stdout.write(f'{claimed}: {status}')
+            done += 1
+            if done == options['max_jobs']:
+                break
+
+    def stop(self, signum, frame):
+        # Текущая задача доработает, новая не будет взята.
+        self.stopping = True
@@ -0,0 +1,165 @@
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+
+from api.management.base import batches
+from recipes.cache import bump_epoch
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Subscribe, Tag)
+from users.models import User
+
+SEED_PASSWORD = 'foodgram-seed'
+
+
+class PowerLaw:
+    """Выбор элементов с вероятностью ~ 1 / rank ** alpha."""
+
+    def __init__(self, items, alpha, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** alpha for rank in range(1, len(self.items) + 1)
+        ))
+        self.rng = rng
+
+    def choice(self):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def sample(self, size):
+        """Уникальная выборка: популярные элементы выпадают чаще."""
+        size = min(size, len(self.items))
+        result = []
+        while len(result) < size:
+            item = self.choice()
+            if item not in result:
+                result.append(item)
+        return result
+
+
+class Command(BaseCommand):
+    """Синтетические данные для нагрузочного тестирования."""
+
+    help = (
+        'Создать N пользователей, M рецептов, избранное, списки покупок '
+        'и подписки со степенным распределением популярности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=10000)
+        parser.add_argument('--subscriptions', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='Показатель степенного распределения.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.alpha = options['alpha']
+        self.prefix = f'seed{options["seed"]}'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с seed={options["seed"]} уже загружены.')
+        if not Ingredient.objects.exists():
+            call_command('import_ingredients')
+        if not Tag.objects.exists():
+            call_command('import_tags')
+
+        users = self.create_users(options['users'])
+        recipes = self.create_recipes(users, options['recipes'])
+        user_activity = PowerLaw(users, self.alpha, self.rng)
+        popularity = PowerLaw(recipes, self.alpha, self.rng)
+        self.create_relations(
+            Favorite, 'user_id', 'recipe_id',
+            user_activity, popularity, options['favorites']
+        )
+        self.create_relations(
+            ShoppingCart, 'user_id', 'recipe_id',
+            user_activity, popularity, options['carts']
+        )
+        self.create_relations(
+            Subscribe, 'user_id', 'author_id',
+            user_activity, PowerLaw(users, self.alpha, self.rng),
+            options['subscriptions']
+        )
+        # bulk_create не вызывает сигналы, счётчики считаются отдельно.
+        call_command('rebuild_counters', stdout=self.stdout)
+        call_command('reconcile_shopping_lists', stdout=self.stdout)
+        bump_epoch()
+
+    def bulk_create(self, model, objs, ignore_conflicts=False):
+        """Пакетная вставка; возвращает pk новых строк."""
+        pks = []
+        for batch in batches(objs, self.batch_size):
+            last = model.objects.order_by('-pk').values_list(
+                'pk', flat=True).first() or 0
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts)
+                pks.extend(model.objects.filter(pk__gt=last).order_by(
+                    'pk').values_list('pk', flat=True))
+        self.stdout.write(f'{model._meta.label}: {len(pks)}')
+        return pks
+
+    def create_users(self, count):
+        password = make_password(SEED_PASSWORD)
+        return self.bulk_create(User, (
+            User(
+                username=f'{self.prefix}_{number}',
+                email=f'{self.prefix}_{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            ) for number in range(count)
+        ))
+
+    def create_recipes(self, users, count):
+        authors = PowerLaw(users, self.alpha, self.rng)
+        ingredients = PowerLaw(
+            Ingredient.objects.values_list('pk', flat=True),
+            self.alpha, self.rng
+        )
+        tags = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+        recipes = self.bulk_create(Recipe, (
+            Recipe(
+                author_id=authors.choice(),
+                name=f'Рецепт {number}',
+                text='Синтетический рецепт. ' * self.rng.randint(5, 40),
+                cooking_time=self.rng.randint(5, 180),
+            ) for number in range(count)
+        ))
+        tags_through = Recipe.tags.through
+        self.bulk_create(tags_through, (
+            tags_through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in self.rng.sample(tags, self.rng.randint(1, len(tags)))
+        ))
+        self.bulk_create(IngredientInRecipe, (
+            IngredientInRecipe(
+                recipe_id=recipe,
+                ingredients_id=ingredient,
+                amount=self.rng.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient in ingredients.sample(self.rng.randint(3, 15))
+        ))
+        return recipes
+
+    def create_relations(self, model, left, right, lefts, rights, count):
+        pairs = set()
+        attempts = count * 3
+        while len(pairs) < count and attempts:
+            attempts -= 1
+            pair = (lefts.choice(), rights.choice())
+            if model is not Subscribe or pair[0] != pair[1]:
+                pairs.add(pair)
+        self.bulk_create(model, (
+            model(**{left: first, right: second})
+            for first, second in sorted(pairs)
+        ), ignore_conflicts=True)
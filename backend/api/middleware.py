@@ -0,0 +1,97 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def get_query_budget(view_cls, action):
+    """Бюджет SQL-запросов действия вьюсета или None."""
+    return getattr(view_cls, 'query_budgets', {}).get(action)
+
+
+class QueryRecorder:
+    """Записывает SQL-запросы и их длительность через execute_wrapper."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, sql))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for duration, _ in self.queries)
+
+    def slowest(self, limit):
+        return sorted(
+            self.queries, key=lambda query: query[0], reverse=True
+        )[:limit]
+
+
+class QueryInspectMiddleware:
+    """Число запросов, время БД и самые медленные запросы в заголовках.
+
+    У потоковых ответов (download_shopping_cart) заголовки уходят до
+    тела, поэтому X-DB-* считают только запросы до начала отдачи.
+    Бюджет проверяется после отдачи тела и учитывает все запросы,
+    включая выполненные при чтении курсора во время стриминга.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_INSPECT_ENABLED:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        response['X-DB-Query-Count'] = recorder.count
+        response['X-DB-Time-Ms'] = f'{recorder.total_time * 1000:.2f}'
+        slowest = recorder.slowest(settings.QUERY_INSPECT_SLOWEST)
+        for number, (duration, sql) in enumerate(slowest, start=1):
+            sql = ' '.join(sql.split())[:settings.QUERY_INSPECT_SQL_LENGTH]
+            response[f'X-DB-Slowest-{number}'] = (
+                f'{duration * 1000:.2f}ms {sql}'
+            )
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None:
+            response['X-DB-Query-Budget'] = budget
+        if response.streaming:
+            response.streaming_content = self.record_stream(
+                response.streaming_content, recorder, request)
+        else:
+            self.check_budget(request, recorder)
+        return response
+
+    def record_stream(self, content, recorder, request):
+        with connection.execute_wrapper(recorder):
+            yield from content
+        self.check_budget(request, recorder)
+
+    @staticmethod
+    def check_budget(request, recorder):
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                '%s %s: %s SQL-запросов при бюджете %s',
+                request.method, request.path, recorder.count, budget
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_cls = getattr(view_func, 'cls', None)
+        actions = getattr(view_func, 'actions', None)
+        if view_cls is not None and actions:
+            action = actions.get(request.method.lower())
+            request.query_budget = get_query_budget(view_cls, action)
@@ -1,8 +1,106 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """Пагинация по ключу (keyset): WHERE (pub_date, id) < курсор.
+
+    Без COUNT(*) и OFFSET: стоимость страницы не зависит от её номера.
+    Поля ключа берутся из cursor_ordering вьюсета.
+    """
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = getattr(view, 'cursor_ordering', self.ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(
+                self.seek(self.decode_cursor(cursor, queryset.model)))
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def seek(self, values):
+        """Условие «строго после курсора» в порядке self.ordering."""
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = self.fields[index]
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[index]})
+            for previous, value in zip(self.fields[:index], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, instance):
+        values = [getattr(instance, field) for field in self.fields]
+        return b64encode(json.dumps(
+            values, default=lambda value: value.isoformat()
+        ).encode()).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            values = json.loads(b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (BinasciiError, ValueError, TypeError, ValidationError):
+            raise NotFound('Неверный курсор.')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.last)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
 
 
 class StandartPagination(PageNumberPagination):
-    """Пользовательский пагинатор."""
+    """Пользовательский пагинатор.
+
+    По умолчанию постраничный (?page=N). С параметром ?cursor
+    (пустым для первой страницы) переключается на KeysetPagination.
+    """
     page_size = 6
     page_size_query_param = 'page_size'
     page_query_param = 'page'
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset = KeysetPagination(self.get_page_size(request))
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,337 @@
+import csv
+import json
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from PIL import ImageFont
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from api.management.base import batches
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from fontTools import subset as font_subset
+except ImportError:
+    font_subset = None
+
+SHOPPING_LIST_TITLE = 'Список покупок:'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson, если он установлен.
+
+    Вывод совпадает с JSONRenderer байт в байт: datetime, Decimal,
+    ленивые строки и прочие типы уходят в тот же encoder_class.
+    С отступами (browsable API, ?indent) и без orjson работает
+    стандартный json.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact or self.get_indent(
+                    accepted_media_type, renderer_context or {})):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=(orjson.OPT_PASSTHROUGH_DATETIME
+                        | orjson.OPT_NON_STR_KEYS),
+            )
+        except orjson.JSONEncodeError:
+            # Например, целые за пределами 64 бит.
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028').replace(
+            '\u2029'.encode(), b'\\u2029')
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый потоковый рендерер списка покупок.
+
+    stream() отдаёт файл по частям, пока строки читаются из курсора,
+    поэтому память не растёт с размером корзины. Рендереры
+    подключены к download_shopping_cart, формат выбирается ?format=.
+    """
+    charset = 'utf-8'
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ошибки DRF (401, 404 и т.п.) приходят словарём.
+            return json.dumps(data, ensure_ascii=False).encode()
+        return b''.join(
+            chunk if isinstance(chunk, bytes) else chunk.encode()
+            for chunk in self.stream(data)
+        )
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield f'{SHOPPING_LIST_TITLE}\n\n'
+        separator = ''
+        for row in rows:
+            yield (
+                f'{separator}{row["name"]}, '
+                f'{row["amount"]} {row["measurement_unit"]}'
+            )
+            separator = '\n'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Количество', 'Единица измерения'))
+        for row in rows:
+            yield writer.writerow(
+                (row['name'], row['amount'], row['measurement_unit']))
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps(row, ensure_ascii=False)
+            separator = ',\n'
+        yield ']'
+
+
+# Однобайтовая кодировка cp1251 для текста PDF: глифы кириллицы
+# задаются в /Differences именами uniXXXX.
+PDF_ENCODING = 'cp1251'
+PDF_FIRST_CHAR = 32
+PDF_CHARS = bytes(range(PDF_FIRST_CHAR, 256)).decode(
+    PDF_ENCODING, errors='replace')
+
+
+@lru_cache(maxsize=None)
+def pdf_font_metrics(path):
+    """Ширины символов и высоты шрифта в единицах 1/1000 кегля."""
+    font = ImageFont.truetype(path, 1000)
+    ascent, descent = font.getmetrics()
+    widths = [round(font.getlength(char)) for char in PDF_CHARS]
+    return widths, ascent, descent
+
+
+@lru_cache(maxsize=None)
+def pdf_font_file(path):
+    """Шрифт для /FontFile2: с fontTools — только глифы PDF_CHARS.
+
+    Полный DejaVuSans весит ~750 КБ, подмножество для cp1251 — в
+    десятки раз меньше. Считается один раз на процесс.
+    """
+    with open(path, 'rb') as font:
+        data = font.read()
+    if font_subset is None:
+        return data
+    options = font_subset.Options()
+    options.layout_features = []
+    options.hinting = False
+    options.notdef_outline = True
+    options.drop_tables += ['FFTM']
+    font = font_subset.load_font(BytesIO(data), options)
+    subsetter = font_subset.Subsetter(options)
+    subsetter.populate(text=PDF_CHARS)
+    subsetter.subset(font)
+    subset = BytesIO()
+    font_subset.save_font(font, subset, options)
+    return subset.getvalue()
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """PDF, который пишется постранично: объекты страниц уходят клиенту
+    по мере заполнения, каталог и таблица xref — в конце файла.
+
+    Для кириллицы в файл встраивается TrueType-шрифт из
+    SHOPPING_LIST_PDF_FONT (подмножество глифов cp1251, если
+    установлен fontTools); без шрифта используется Helvetica.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    page_width = 595
+    page_height = 842
+    margin = 50
+    font_size = 11
+    leading = 16
+
+    catalog_id = 1
+    pages_id = 2
+    font_id = 3
+
+    def stream(self, rows):
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = self.font_id + 1
+        self.page_ids = []
+        yield self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield from self.write_font()
+        lines_per_page = (
+            (self.page_height - 2 * self.margin) // self.leading
+        )
+        page = [SHOPPING_LIST_TITLE, '']
+        for row in rows:
+            if len(page) == lines_per_page:
+                yield from self.write_page(page)
+                page = []
+            page.append(
+                f'{row["name"]}, {row["amount"]} {row["measurement_unit"]}'
+            )
+        yield from self.write_page(page)
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.page_ids)
+        yield self.write_object(
+            self.pages_id,
+            f'<< /Type /Pages /Kids [{kids}] '
+            f'/Count {len(self.page_ids)} >>'.encode()
+        )
+        yield self.write_object(
+            self.catalog_id,
+            f'<< /Type /Catalog /Pages {self.pages_id} 0 R >>'.encode()
+        )
+        yield self.write_xref()
+
+    def write(self, data):
+        self.offset += len(data)
+        return data
+
+    def allocate(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def write_object(self, object_id, body):
+        self.offsets[object_id] = self.offset
+        return self.write(
+            f'{object_id} 0 obj\n'.encode() + body + b'\nendobj\n')
+
+    def write_stream(self, object_id, content):
+        return self.write_object(
+            object_id,
+            b'<< /Length %d >>\nstream\n' % len(content)
+            + content + b'\nendstream'
+        )
+
+    def write_font(self):
+        differences = ' '.join(
+            f'/uni{ord(char):04X}' for char in PDF_CHARS[128 - 32:]
+        )
+        encoding = (
+            f'/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            f'/Differences [128 {differences}] >>'
+        )
+        to_unicode_id = self.allocate()
+        yield self.write_stream(to_unicode_id, self.to_unicode_cmap())
+        encoding += f' /ToUnicode {to_unicode_id} 0 R'
+        path = settings.SHOPPING_LIST_PDF_FONT
+        try:
+            widths, ascent, descent = pdf_font_metrics(path)
+        except OSError:
+            yield self.write_object(self.font_id, (
+                f'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                f'{encoding} >>'
+            ).encode())
+            return
+        descriptor_id = self.allocate()
+        file_id = self.allocate()
+        yield self.write_object(self.font_id, (
+            f'<< /Type /Font /Subtype /TrueType /BaseFont /Embedded '
+            f'/FirstChar {PDF_FIRST_CHAR} /LastChar 255 '
+            f'/Widths [{" ".join(map(str, widths))}] '
+            f'/FontDescriptor {descriptor_id} 0 R {encoding} >>'
+        ).encode())
+        yield self.write_object(descriptor_id, (
+            f'<< /Type /FontDescriptor /FontName /Embedded /Flags 32 '
+            f'/FontBBox [-1000 -{descent} 2000 {ascent}] /ItalicAngle 0 '
+            f'/Ascent {ascent} /Descent -{descent} /CapHeight {ascent} '
+            f'/StemV 80 /FontFile2 {file_id} 0 R >>'
+        ).encode())
+        font = pdf_font_file(path)
+        yield self.write_object(
+            file_id,
+            b'<< /Length %d /Length1 %d >>\nstream\n' % (
+                len(font), len(font))
+            + font + b'\nendstream'
+        )
+
+    @staticmethod
+    def to_unicode_cmap():
+        """CMap байт -> Unicode, чтобы текст копировался и искался."""
+        chars = [
+            f'<{code:02X}> <{ord(char):04X}>'
+            for code, char in enumerate(PDF_CHARS, start=PDF_FIRST_CHAR)
+        ]
+        # В одном блоке bfchar допускается не больше 100 записей.
+        blocks = ''.join(
+            f'{len(block)} beginbfchar\n' + '\n'.join(block)
+            + '\nendbfchar\n'
+            for block in batches(chars, 100)
+        )
+        return (
+            '/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n'
+            '/CMapName /Adobe-Identity-UCS def /CMapType 2 def\n'
+            '1 begincodespacerange <00> <FF> endcodespacerange\n'
+            f'{blocks}'
+            'endcmap CMapName currentdict /CMap defineresource pop end end'
+        ).encode()
+
+    def write_page(self, lines):
+        content = [
+            b'BT /F1 %d Tf %d TL %d %d Td' % (
+                self.font_size, self.leading, self.margin,
+                self.page_height - self.margin
+            )
+        ]
+        for line in lines:
+            text = line.encode(PDF_ENCODING, errors='replace')
+            text = text.replace(b'\\', b'\\\\').replace(
+                b'(', b'\\(').replace(b')', b'\\)')
+            content.append(b'(%s) Tj T*' % text)
+        content.append(b'ET')
+        content_id = self.allocate()
+        page_id = self.allocate()
+        self.page_ids.append(page_id)
+        yield self.write_stream(content_id, b'\n'.join(content))
+        yield self.write_object(page_id, (
+            f'<< /Type /Page /Parent {self.pages_id} 0 R '
+            f'/MediaBox [0 0 {self.page_width} {self.page_height}] '
+            f'/Resources << /Font << /F1 {self.font_id} 0 R >> >> '
+            f'/Contents {content_id} 0 R >>'
+        ).encode())
+
+    def write_xref(self):
+        size = self.next_id
+        xref = [b'xref\n0 %d\n0000000000 65535 f \n' % size]
+        for object_id in range(1, size):
+            xref.append(b'%010d 00000 n \n' % self.offsets[object_id])
+        xref.append((
+            f'trailer\n<< /Size {size} /Root {self.catalog_id} 0 R >>\n'
+            f'startxref\n{self.offset}\n%%EOF\n'
+        ).encode())
+        return b''.join(xref)
@@ -1,16 +1,46 @@
-from django.db.models import F
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Manager, prefetch_related_objects
 from djoser import serializers as ds
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Subscribe, Tag)
+                            ShoppingCart, ShoppingListItem, Subscribe, Tag)
+from recipes.cache import get_epoch
+from recipes.images import image_srcset
 from users.models import User
+from .cache import count_fragments, fragment_key, local_cache
+from .fields import BulkPrimaryKeyRelatedField
+from .fieldsets import SparseFieldsMixin
+from .loaders import get_relation_sets
+
+
+def get_recipes_limit(request):
+    """Проверенный ?recipes_limit: целое от 1 или None, если не передан."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None:
+        return None
+    try:
+        recipes_limit = int(recipes_limit)
+    except ValueError:
+        recipes_limit = 0
+    if recipes_limit < 1:
+        raise serializers.ValidationError(
+            {'recipes_limit': 'Должно быть целым числом больше нуля.'})
+    return recipes_limit
+
+
+def pick(data, names):
+    """Оставить в словаре только ключи из names (None — все)."""
+    if names is None:
+        return data
+    return {key: value for key, value in data.items() if key in names}
 
 
 # USERS ZONE
-class UserReadSerializer(ds.UserSerializer):
+class UserReadSerializer(SparseFieldsMixin, ds.UserSerializer):
     """USER for READ: GET: api/users/ :: /api/users/{id}/ :: /api/users/me/."""
 
     is_subscribed = SerializerMethodField(read_only=True)
@@ -27,37 +57,16 @@ class UserReadSerializer(ds.UserSerializer):
         )
 
     def get_is_subscribed(self, user):
-        request = self.context.get('request')
-        return (request.user.is_authenticated and user.following.filter(
-            user=request.user).exists())
-
-
-class SubscribeSerializer(serializers.ModelSerializer):
-    """Сериализатор подписки. POST, DEL: /api/users/{id}/subscribe/"""
-
-    class Meta:
-        model = Subscribe
-        fields = ('user', 'author')
-
-    def validate(self, data):
-        user = data.get('user')
-        author = data.get('author')
-        if user == author:
-            raise serializers.ValidationError(
-                {
-                    'error': 'Ошибка подписки. Попытка подписаться на себя.'
-                }
-            )
-        return data
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
+        return get_relation_sets(self.context['request']).contains(
+            Subscribe, user.pk)
 
 
 class SubscriptionSerializer(UserReadSerializer):
     """Сериализатор списка подписок."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count',
-        read_only=True
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -67,16 +76,16 @@ class SubscriptionSerializer(UserReadSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = obj.recipes.all()[:(int(recipes_limit))]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipes.all()[:recipes_limit]
         return RecipeShortSerializer(recipes, many=True).data
 
 
 # TAGS ZONE
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализато тегов. GET: api/tags/ :: api/tags/{id}/"""
 
     class Meta:
@@ -108,7 +117,17 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 
 
 # RECIPES ZONE
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadListSerializer(serializers.ListSerializer):
+    """Список рецептов через кэш фрагментов одним get_many."""
+
+    def to_representation(self, data):
+        if not self.child.use_fragments():
+            return super().to_representation(data)
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.represent_cached(list(recipes))
+
+
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Чтение рецептов. GET: api/recipes/ :: api/recipes/{id}/"""
     tags = TagSerializer(many=True, read_only=True)
     author = UserReadSerializer(read_only=True)
@@ -116,6 +135,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     image = Base64ImageField(max_length=None, use_url=True, required=False)
+    image_srcset = serializers.SerializerMethodField(read_only=True)
+    fast_read = True
 
     class Meta:
         model = Recipe
@@ -128,53 +149,185 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',  # method
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time'
         )
+        list_serializer_class = RecipeReadListSerializer
 
-    def get_ingredients(self, obj):
-        """Custom queryset: filter IngredientInRecipe by recipe."""
-        recipe = obj
-        ingredients = recipe.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('recipe_ingredients__amount')
-        )
-        return ingredients
-
-    def get_is_favorited(self, obj):
+    def use_fragments(self):
         request = self.context.get('request')
         return (
-            request.user.is_authenticated
-            and obj.recipes_favorite_related.filter(
-                user=request.user).exists()
+            settings.RECIPE_FRAGMENT_CACHE
+            and request is not None
+            and request.user.is_authenticated
+            and self.get_selection() is None
         )
 
-    def get_is_in_shopping_cart(self, obj):
+    def to_representation(self, instance):
+        if self.parent is None and self.use_fragments():
+            return self.represent_cached([instance])[0]
+        return self.represent(instance)
+
+    def represent(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        if settings.FAST_READ_SERIALIZERS and self.fast_read:
+            return self.represent_fast(instance)
+        return super().to_representation(instance)
+
+    def represent_fast(self, instance):
+        """То же представление без полей DRF: словари собираются сразу.
+
+        Ожидает рецепт из Recipe.objects.for_read(); совпадение вывода
+        с обычным путём проверяет api.tests.ReadParityTest, на живой
+        базе — команда check_read_parity. Поля вне выборки
+        ?fields=/?omit= не вычисляются.
+        """
+        request = self.context['request']
+        selection = self.get_selection()
+        nested = selection or {}
+        builders = {
+            'id': lambda: instance.id,
+            'tags': lambda: [
+                pick({
+                    'id': tag.id,
+                    'name': tag.name,
+                    'color': tag.color,
+                    'slug': tag.slug,
+                }, nested.get('tags')) for tag in instance.tags.all()
+            ],
+            'author': lambda: self.represent_author_fast(
+                instance.author, nested.get('author')),
+            'ingredients': lambda: self.get_ingredients(instance),
+            'is_favorited': lambda: self.get_is_favorited(instance),
+            'is_in_shopping_cart': lambda: self.get_is_in_shopping_cart(
+                instance),
+            'name': lambda: instance.name,
+            'image': lambda: request.build_absolute_uri(
+                instance.image.url) if instance.image else None,
+            'image_srcset': lambda: image_srcset(
+                instance, request.build_absolute_uri),
+            'text': lambda: instance.text,
+            'cooking_time': lambda: instance.cooking_time,
+        }
+        return {
+            name: builders[name]() for name in self.Meta.fields
+            if selection is None or name in selection
+        }
+
+    def represent_author_fast(self, author, names):
+        data = {
+            'email': author.email,
+            'id': author.id,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+        }
+        if names is None or 'is_subscribed' in names:
+            is_subscribed = getattr(author, 'is_subscribed', None)
+            if is_subscribed is None:
+                is_subscribed = get_relation_sets(
+                    self.context['request']).contains(Subscribe, author.pk)
+            data['is_subscribed'] = is_subscribed
+        return pick(data, names)
+
+    def represent_cached(self, recipes):
+        """Общая часть рецептов из кэша, поверх неё — флаги пользователя.
+
+        Связи загружаются только для рецептов, которых нет в кэше.
+        """
+        request = self.context['request']
+        epoch = get_epoch()
+        keys = {
+            recipe.pk: fragment_key(recipe, request, epoch)
+            for recipe in recipes
+        }
+        fragments = local_cache.get_many(list(keys.values()))
+        missing = [
+            recipe for recipe in recipes if keys[recipe.pk] not in fragments
+        ]
+        prefetch_related_objects(missing, *Recipe.objects.read_prefetches())
+        new = {keys[recipe.pk]: self.represent(recipe) for recipe in missing}
+        local_cache.set_many(new, settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(new)
+        hits, misses = getattr(request, 'fragment_cache', (0, 0))
+        request.fragment_cache = (
+            hits + len(recipes) - len(missing), misses + len(missing))
+        count_fragments(len(recipes) - len(missing), len(missing))
+        result = []
+        for recipe in recipes:
+            if hasattr(recipe, 'author_is_subscribed'):
+                recipe.author.is_subscribed = recipe.author_is_subscribed
+            data = dict(fragments[keys[recipe.pk]])
+            data['author'] = dict(
+                data['author'],
+                is_subscribed=self.fields['author'].get_is_subscribed(
+                    recipe.author)
+            )
+            data['is_favorited'] = self.get_is_favorited(recipe)
+            data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(recipe)
+            result.append(data)
+        return result
+
+    def get_ingredients(self, obj):
+        """Ингредиенты рецепта из prefetch recipe_ingredients."""
+        return [
+            {
+                'id': item.ingredients.id,
+                'name': item.ingredients.name,
+                'measurement_unit': item.ingredients.measurement_unit,
+                'amount': item.amount,
+            } for item in obj.recipe_ingredients.all()
+        ]
+
+    def get_image_srcset(self, obj):
+        """srcset копий: {'webp': 'url 160w, url 480w', 'jpeg': ...}."""
         request = self.context.get('request')
-        return (
-            request.user.is_authenticated
-            and obj.recipes_shoppingcart_related.filter(
-                user=request.user).exists()
-        )
+        return image_srcset(
+            obj, request.build_absolute_uri if request else str)
+
+    def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return get_relation_sets(self.context['request']).contains(
+            Favorite, obj.pk)
+
+    def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return get_relation_sets(self.context['request']).contains(
+            ShoppingCart, obj.pk)
+
+
+class IngredientInRecipeListSerializer(serializers.ListSerializer):
+    """Проверяет id всех ингредиентов рецепта одним запросом."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = BulkPrimaryKeyRelatedField(
+            queryset=Ingredient.objects.all()
+        ).to_internal_value_bulk([item['id'] for item in items])
+        for item, ingredient in zip(items, ingredients):
+            item['id'] = ingredient
+        return items
 
 
 class IngredientInRecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Ингредиенты в рецепте доп. Include RecipeCreateUpdateSerializer"""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(write_only=True)
 
     class Meta:
         model = IngredientInRecipe
         fields = ('id', 'amount')
+        list_serializer_class = IngredientInRecipeListSerializer
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Создание и обновление рецепта. POST: api/recipes/"""
     ingredients = IngredientInRecipeCreateUpdateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all()
     )
     image = Base64ImageField(max_length=None, use_url=True, required=False)
@@ -235,6 +388,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         ]
         IngredientInRecipe.objects.bulk_create(ingredients_in_recipe)
 
+    @transaction.atomic
     def create(self, data):
         """Создать рецепт."""
         request = self.context.get('request')
@@ -245,23 +399,74 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         self.create_ingredients(ingredients, recipe)
         return recipe
 
+    @staticmethod
+    def update_tags(recipe, tags):
+        """Добавить и удалить только изменившиеся теги."""
+        current = set(recipe.tags.values_list('id', flat=True))
+        new = {tag.id for tag in tags}
+        if current - new:
+            recipe.tags.remove(*(current - new))
+        if new - current:
+            recipe.tags.add(*(new - current))
+
+    def update_ingredients(self, recipe, ingredients):
+        """Записать только разницу с текущими ингредиентами рецепта.
+
+        Возвращает изменение количеств {ingredient_id: delta}.
+        """
+        new = {item['id'].id: item['amount'] for item in ingredients}
+        delta = {}
+        to_update = []
+        to_delete = []
+        kept = set()
+        for row in recipe.recipe_ingredients.all():
+            ingredient_id = row.ingredients_id
+            delta[ingredient_id] = delta.get(ingredient_id, 0) - row.amount
+            if ingredient_id not in new or ingredient_id in kept:
+                to_delete.append(row.id)
+                continue
+            kept.add(ingredient_id)
+            if row.amount != new[ingredient_id]:
+                row.amount = new[ingredient_id]
+                to_update.append(row)
+        for ingredient_id, amount in new.items():
+            delta[ingredient_id] = delta.get(ingredient_id, 0) + amount
+        if to_delete:
+            IngredientInRecipe.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            IngredientInRecipe.objects.bulk_update(to_update, ['amount'])
+        to_create = [
+            item for item in ingredients if item['id'].id not in kept
+        ]
+        if to_create:
+            self.create_ingredients(to_create, recipe)
+        return delta
+
+    @transaction.atomic
     def update(self, instance, data):
         """Обновить рецепт."""
         tags = data.pop('tags')
         ingredients = data.pop('ingredients')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients(recipe=instance, ingredients=ingredients)
+        self.update_tags(instance, tags)
+        delta = self.update_ingredients(instance, ingredients)
+        ShoppingListItem.objects.apply(
+            list(instance.recipes_shoppingcart_related.values_list(
+                'user_id', flat=True)),
+            delta
+        )
         return super().update(instance, data)
 
 
 class RecipeShortSerializer(RecipeReadSerializer):
     """Короткая версия рецепта."""
+    fast_read = False
+
+    def use_fragments(self):
+        return False
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
 class ShoppingCartSerializer(RecipeShortSerializer):
@@ -271,15 +476,6 @@ class ShoppingCartSerializer(RecipeShortSerializer):
         model = ShoppingCart
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user = data['user']
-        if user.recipes_shoppingcart_related.filter(
-                recipe=data['recipe']).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже в списке покупок.'
-            )
-        return data
-
 
 class FavoriteSerializer(RecipeShortSerializer):
     """Сериализатор избранного."""
@@ -288,11 +484,11 @@ class FavoriteSerializer(RecipeShortSerializer):
         model = Favorite
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user = data['user']
-        if user.recipes_favorite_related.filter(
-                recipe=data['recipe']).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже в избранном.'
-            )
-        return data
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id для пачечных операций: {"ids": [1, 2, 3]}."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RELATIONS_BULK_MAX
+    )
@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+from .middleware import QueryRecorder, get_query_budget
+
+
+@contextmanager
+def assert_query_budget(view_cls, action):
+    """Упасть, если действие вьюсета превысило свой бюджет запросов.
+
+    Использование в тестах на заполненной базе (seed_scale):
+
+        with assert_query_budget(RecipeViewSet, 'list'):
+            self.client.get('/api/recipes/')
+
+    Потоковый ответ нужно дочитать внутри блока: его запросы
+    выполняются при отдаче тела.
+    """
+    budget = get_query_budget(view_cls, action)
+    if budget is None:
+        raise AssertionError(
+            f'У {view_cls.__name__}.{action} не задан query_budgets.')
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        yield recorder
+    if recorder.count > budget:
+        queries = '\n'.join(
+            f'{number}. {sql}'
+            for number, (_, sql) in enumerate(recorder.queries, start=1)
+        )
+        raise AssertionError(
+            f'{view_cls.__name__}.{action}: {recorder.count} SQL-запросов '
+            f'при бюджете {budget}.\n{queries}'
+        )
@@ -0,0 +1,349 @@
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from users.models import User
+from .serializers import RecipeReadSerializer
+from .testing import assert_query_budget
+from .views import FoodgramUserViewSet, RecipeViewSet
+
+
+# Кэш в памяти процесса при любом способе запуска тестов: общий
+# FileBasedCache переносил бы версии и троттлинг между запусками.
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-local',
+    },
+}
+
+
+def seed(**options):
+    """Небольшой набор seed_scale: авторы, теги, ингредиенты, связи."""
+    options = {
+        'users': 8, 'recipes': 30, 'favorites': 60, 'carts': 30,
+        'subscriptions': 30, **options,
+    }
+    call_command('import_ingredients', stdout=StringIO())
+    call_command('import_tags', stdout=StringIO())
+    call_command('seed_scale', stdout=StringIO(), **options)
+
+
+def active_user():
+    """Пользователь с избранным, корзиной и подписками."""
+    return User.objects.filter(
+        recipes_favorite_related__isnull=False,
+        recipes_shoppingcart_related__isnull=False,
+        follower__isnull=False,
+    ).distinct().order_by('pk').first()
+
+
+def upsert_returning_supported():
+    """INSERT ... ON CONFLICT DO NOTHING RETURNING в RelationQuerySet."""
+    if connection.vendor == 'postgresql':
+        return True
+    return (connection.vendor == 'sqlite'
+            and sqlite3.sqlite_version_info >= (3, 35))
+
+
+@skipUnless(upsert_returning_supported(), 'Нужен ON CONFLICT ... RETURNING.')
+@override_settings(CACHES=TEST_CACHES)
+class RelationConcurrencyTest(TransactionTestCase):
+    """Одновременные добавления и удаления одной пары пользователь-рецепт."""
+    threads = 8
+    rounds = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+            first_name='Имя', last_name='Фамилия')
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст', cooking_time=5)
+        for number, amount in enumerate((100, 2), start=1):
+            IngredientInRecipe.objects.create(
+                recipe=self.recipe, amount=amount,
+                ingredients=Ingredient.objects.create(
+                    name=f'Ингредиент {number}', measurement_unit='г'))
+        self.token = Token.objects.create(user=self.user).key
+
+    def hammer(self, url):
+        """Потоки поочерёдно шлют POST и DELETE; вернуть коды ответов."""
+        codes = Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(self.threads)
+
+        def worker(number):
+            client = APIClient(raise_request_exception=False)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+            start.wait()
+            try:
+                for step in range(self.rounds):
+                    method = 'delete' if (number + step) % 3 == 0 else 'post'
+                    response = getattr(client, method)(url)
+                    with lock:
+                        codes[(method, response.status_code)] += 1
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=worker, args=(number,))
+            for number in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return codes
+
+    def assert_codes(self, codes):
+        self.assertEqual(sum(codes.values()), self.threads * self.rounds)
+        self.assertLessEqual(set(codes), {
+            ('post', 201), ('post', 400), ('delete', 204), ('delete', 404)})
+
+    def test_favorite(self):
+        codes = self.hammer(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assert_codes(codes)
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            self.recipe.favorites_count,
+            Favorite.objects.filter(recipe=self.recipe).count())
+
+    def test_shopping_cart(self):
+        codes = self.hammer(f'/api/recipes/{self.recipe.pk}/shopping_cart/')
+        self.assert_codes(codes)
+        self.recipe.refresh_from_db()
+        in_cart = ShoppingCart.objects.filter(
+            user=self.user, recipe=self.recipe).exists()
+        self.assertEqual(self.recipe.shopping_carts_count, int(in_cart))
+        expected = (
+            ShoppingListItem.objects.recipe_amounts([self.recipe.pk])
+            if in_cart else {}
+        )
+        self.assertEqual(
+            dict(ShoppingListItem.objects.filter(
+                user=self.user).values_list('ingredient_id', 'amount')),
+            expected)
+
+
+@skipUnless(upsert_returning_supported(), 'Нужен ON CONFLICT ... RETURNING.')
+@override_settings(CACHES=TEST_CACHES)
+class RelationErrorsTest(TestCase):
+    """Тела ответов 400 на повторные и недопустимые связи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+            first_name='Имя', last_name='Фамилия')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст', cooking_time=5)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_subscribe_self(self):
+        response = self.client.post(f'/api/users/{self.user.pk}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'error': ['Ошибка подписки. Попытка подписаться на себя.']})
+
+    def test_favorite_twice(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'non_field_errors': ['Рецепт уже в избранном.']})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConditionalGetTest(TestCase):
+    """304 только по ETag: Last-Modified не отдаётся и не проверяется."""
+
+    def setUp(self):
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+
+    def test_etag(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_ignored(self):
+        response = self.client.get(
+            '/api/tags/',
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryBudgetTest(TestCase):
+    """Действия укладываются в query_budgets на заполненной базе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed()
+        cls.user = active_user()
+        cls.recipe = Recipe.objects.order_by('-favorites_count').first()
+        cls.token = Token.objects.create(user=cls.user).key
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def clients(self):
+        for name in ('anonymous', 'authenticated'):
+            with self.subTest(client=name):
+                yield getattr(self, name)
+
+    def get(self, client, view_cls, action, url):
+        with assert_query_budget(view_cls, action):
+            response = client.get(url)
+            content = (
+                b''.join(response.streaming_content)
+                if response.streaming else response.content
+            )
+        self.assertEqual(response.status_code, 200, content)
+        return response
+
+    def test_recipes_list(self):
+        for client in self.clients():
+            for url in (
+                '/api/recipes/',
+                '/api/recipes/?page=2&limit=6',
+                '/api/recipes/?tags=zavtrak&tags=odeb',
+                '/api/recipes/?fields=id,name,author.username',
+            ):
+                self.get(client, RecipeViewSet, 'list', url)
+
+    def test_recipes_list_filtered_by_user(self):
+        self.get(self.authenticated, RecipeViewSet, 'list',
+                 '/api/recipes/?is_favorited=1&is_in_shopping_cart=1')
+
+    def test_recipe_retrieve(self):
+        for client in self.clients():
+            self.get(client, RecipeViewSet, 'retrieve',
+                     f'/api/recipes/{self.recipe.pk}/')
+
+    def test_download_shopping_cart(self):
+        for renderer in ('txt', 'csv', 'json'):
+            with self.subTest(format=renderer):
+                self.get(
+                    self.authenticated, RecipeViewSet,
+                    'download_shopping_cart',
+                    f'/api/recipes/download_shopping_cart/?format={renderer}')
+
+    def test_users_list(self):
+        for client in self.clients():
+            self.get(client, FoodgramUserViewSet, 'list', '/api/users/')
+
+    def test_subscriptions(self):
+        for url in (
+            '/api/users/subscriptions/',
+            '/api/users/subscriptions/?recipes_limit=2',
+        ):
+            self.get(self.authenticated, FoodgramUserViewSet,
+                     'subscriptions', url)
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class ReadParityTest(TestCase):
+    """represent_fast совпадает с to_representation DRF байт в байт."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed()
+        cls.user = active_user()
+        recipes = Recipe.objects.order_by('pk')
+        # Картинки с готовыми копиями и одна без них (srcset = None).
+        with override_settings(JOBS_SYNC=True):
+            for recipe in recipes[:3]:
+                cls.set_image(recipe)
+        cls.set_image(recipes[3])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @staticmethod
+    def set_image(recipe):
+        buffer = BytesIO()
+        Image.new('RGB', (640, 400), '#49B64E').save(buffer, 'PNG')
+        recipe.image.save(f'{recipe.pk}.png', ContentFile(buffer.getvalue()))
+
+    def assert_parity(self, user, query=''):
+        request = Request(APIRequestFactory().get(f'/api/recipes/{query}'))
+        request.user = user
+        view = RecipeViewSet(
+            request=request, action='list', format_kwarg=None,
+            args=(), kwargs={})
+        serializer = RecipeReadSerializer(
+            context=view.get_serializer_context())
+        renderer = JSONRenderer()
+        recipes = view.get_queryset().order_by('pk')
+        self.assertTrue(recipes)
+        for recipe in recipes:
+            if hasattr(recipe, 'author_is_subscribed'):
+                recipe.author.is_subscribed = recipe.author_is_subscribed
+            with self.subTest(recipe=recipe.pk, user=str(user), query=query):
+                self.assertEqual(
+                    renderer.render(serializer.represent_fast(recipe)),
+                    renderer.render(
+                        ModelSerializer.to_representation(serializer, recipe)))
+
+    def test_anonymous(self):
+        self.assert_parity(AnonymousUser())
+
+    def test_user_with_favorites(self):
+        recipes = Recipe.objects.for_read(self.user)
+        for flag in ('is_favorited', 'is_in_shopping_cart',
+                     'author_is_subscribed'):
+            self.assertTrue(recipes.filter(**{flag: True}).exists(), flag)
+        self.assert_parity(self.user)
+
+    def test_fields(self):
+        for query in (
+            '?fields=id,name,image,image_srcset,is_favorited,'
+            'author.username,author.is_subscribed,tags.slug,ingredients',
+            '?omit=text,author.email,tags.color',
+        ):
+            for user in (AnonymousUser(), self.user):
+                self.assert_parity(user, query)
@@ -0,0 +1,64 @@
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл слишком большой.'
+    default_code = 'payload_too_large'
+
+
+def check_content_length(request):
+    """Отказать по Content-Length, не читая тело запроса."""
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    # Запас на заголовки частей multipart.
+    if length > settings.RECIPE_IMAGE_MAX_SIZE + 64 * 1024:
+        raise PayloadTooLarge()
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл на диск по частям и обрывает загрузку сверх лимита.
+
+    Лимит проверяется на каждом чанке, поэтому он работает и без
+    Content-Length (chunked).
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.file.close()
+            raise PayloadTooLarge()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def validate_image_upload(upload):
+    """Проверить формат и размеры по заголовку, затем целостность файла.
+
+    Image.open читает только заголовок, так что огромная по пикселям
+    картинка отклоняется до декодирования. Возвращает имя для сохранения.
+    """
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            width, height = image.size
+            formats = settings.RECIPE_IMAGE_UPLOAD_FORMATS
+            if image_format not in formats:
+                raise serializers.ValidationError(
+                    {'image': f'Допустимые форматы: {", ".join(formats)}.'})
+            if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                raise serializers.ValidationError(
+                    {'image': f'Слишком большое изображение: '
+                              f'{width}x{height}.'})
+            image.verify()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise serializers.ValidationError(
+            {'image': 'Загрузите корректное изображение.'})
+    upload.seek(0)
+    return f'{uuid.uuid4()}.{image_format.lower()}'
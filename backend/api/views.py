@@ -1,35 +1,129 @@
 from datetime import datetime
 
-from django.db.models import F, Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer, UserCreateSerializer
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FileUploadParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Subscribe, Tag)
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, Subscribe, Tag)
+from recipes.cache import TAGS_VERSION_KEY, get_versions
+from recipes.search import INDEX_VERSION_KEY, get_ingredient_index
 from users.models import User
-from .filters import IngredientFilter, RecipeFilter
+from .cache import (AnonymousResponseCacheMixin, ConditionalGetMixin,
+                    RecipeConditionalGetMixin)
+from .fieldsets import SparseFieldsViewMixin
+from .filters import RecipeFilter
+from .loaders import get_relation_sets
 from .pagination import StandartPagination
 from .permissions import IsAuthorOrAdminOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListPDFRenderer, ShoppingListTextRenderer)
+from .uploads import (LimitedUploadHandler, check_content_length,
+                      validate_image_upload)
+from .serializers import (BulkIdsSerializer, FavoriteSerializer,
+                          IngredientSerializer,
                           RecipeCreateUpdateSerializer, RecipeReadSerializer,
                           RecipeShortSerializer, ShoppingCartSerializer,
-                          SubscribeSerializer, SubscriptionSerializer,
-                          TagSerializer, UserReadSerializer)
+                          SubscriptionSerializer,
+                          TagSerializer, UserReadSerializer,
+                          get_recipes_limit)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+# Ответ 400 на повторное добавление связи.
+RELATION_EXISTS_MESSAGES = {
+    Favorite: 'Рецепт уже в избранном.',
+    ShoppingCart: 'Рецепт уже в списке покупок.',
+    Subscribe: 'Вы уже подписаны на этого автора.',
+}
+
+SUBSCRIBE_SELF_MESSAGE = 'Ошибка подписки. Попытка подписаться на себя.'
+
+
+def url_pk(value):
+    """Id из URL; не число — 404, как у get_object_or_404."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404
+
+
+def change_relations(request, model, targets):
+    """Пачкой добавить (POST) или удалить (DELETE) связи: {"ids": [...]}.
+
+    Связи создаются одним INSERT только с объектами из targets, в ответе
+    статус каждого id: created, exists, deleted или not_found.
+    """
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    relation_sets = get_relation_sets(request)
+    if request.method == 'POST':
+        created = model.objects.add_many(request.user.id, ids, targets)
+        statuses = dict.fromkeys(created, 'created')
+        rest = set(ids) - created
+        if rest:
+            statuses.update(dict.fromkeys(targets.filter(
+                pk__in=rest).values_list('pk', flat=True), 'exists'))
+        for pk in created:
+            relation_sets.add(model, pk)
+    else:
+        deleted = model.objects.remove_many(request.user.id, ids)
+        statuses = dict.fromkeys(deleted, 'deleted')
+        for pk in deleted:
+            relation_sets.discard(model, pk)
+    return Response({'results': [
+        {'id': pk, 'status': statuses.get(pk, 'not_found')} for pk in ids
+    ]})
+
+
+class RecipeViewSet(RecipeConditionalGetMixin, AnonymousResponseCacheMixin,
+                    SparseFieldsViewMixin, viewsets.ModelViewSet):
     """Кастомный вьюсет рецептов модели Recipe."""
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrAdminOrReadOnly]
     filterset_class = RecipeFilter
     pagination_class = StandartPagination
+    query_budgets = {
+        'list': 8,
+        'retrieve': 4,
+        # Вместе с запросом списка, который выполняется при стриминге.
+        'download_shopping_cart': 2,
+    }
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            user = self.request.user
+            fields = self.get_read_fields()
+            return Recipe.objects.for_read(user, fields=fields, prefetch=(
+                fields is not None or not (
+                    settings.RECIPE_FRAGMENT_CACHE and user.is_authenticated)
+            ))
+        return super().get_queryset()
+
+    def get_read_fields(self):
+        """Части рецепта для for_read() по выборке ?fields=/?omit=."""
+        selection = self.get_field_selection()
+        if selection is None:
+            return None
+        fields = set(selection)
+        if 'author' in selection and (
+                selection['author'] is None
+                or 'is_subscribed' in selection['author']):
+            fields.add('author_is_subscribed')
+        return fields
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -38,25 +132,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeShortSerializer
         return RecipeCreateUpdateSerializer
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if hasattr(request, 'fragment_cache'):
+            hits, misses = request.fragment_cache
+            response['X-Fragment-Cache'] = f'hits={hits}; misses={misses}'
+        return response
+
     @staticmethod
     def create_relation(request, pk, serializer):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        context = {'request': request}
-        serializer = serializer(data=data, context=context)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        """Один INSERT ... ON CONFLICT DO NOTHING; 404 и 400 по итогу."""
+        pk = url_pk(pk)
+        model = serializer.Meta.model
+        if not model.objects.add_many(request.user.id, [pk]):
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                RELATION_EXISTS_MESSAGES[model]]})
+        get_relation_sets(request).add(model, pk)
+        serializer = serializer(model(user_id=request.user.id, recipe_id=pk))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
     def delete_relation(request, pk, model):
-        get_object_or_404(
-            model, user=request.user, recipe=get_object_or_404(
-                Recipe, pk=pk)
-        ).delete()
+        """Один DELETE: нет рецепта или связи — 404."""
+        pk = url_pk(pk)
+        if not model.objects.remove_many(request.user.id, [pk]):
+            raise Http404
+        get_relation_sets(request).discard(model, pk)
         message = {
             'detail':
                 'Данные удалены.'
@@ -64,37 +167,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(message, status=status.HTTP_204_NO_CONTENT)
 
     @staticmethod
-    def export_file(ingredients):
-        data = []
-        for ingredient in ingredients:
-            data.append(
-                f'{ingredient["name"]}, '
-                f'{ingredient["amount"]} '
-                f'{ingredient["measurement_unit"]}'
-            )
-        content = 'Список покупок:\n\n' + '\n'.join(data)
+    def export_file(request, ingredients):
+        """Отдать список покупок потоком в формате из ?format=."""
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
         date = datetime.today()
-        filename = f'{date}_shopping_list.txt'
-        request = HttpResponse(content, content_type='text/plain')
-        request['Content-Disposition'] = f'attachment; filename={filename}'
-        return request
+        filename = f'{date}_shopping_list.{renderer.format}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
 
     @action(
         detail=False,
         methods=['GET'],
-        permission_classes=[IsAuthorOrAdminOrReadOnly]
+        permission_classes=[IsAuthorOrAdminOrReadOnly],
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+            ShoppingListPDFRenderer,
+        ]
     )
     def download_shopping_cart(self, request):
-        """Скачать список покупок."""
-        user = request.user
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__recipes_shoppingcart_related__user=user).values(
-            name=F('ingredients__name'),
-            measurement_unit=F('ingredients__measurement_unit')).order_by(
-            'ingredients__name').annotate(
-            amount=Sum('amount')
-        )
-        return RecipeViewSet.export_file(ingredients)
+        """Скачать список покупок: ?format=txt|csv|json|pdf."""
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user).values(
+            'amount',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit')).order_by(
+            'ingredient__name').iterator(chunk_size=2000)
+        return RecipeViewSet.export_file(request, ingredients)
 
     @action(
         detail=True,
@@ -113,6 +218,33 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def undo_shopping_cart(self, request, pk):
         return RecipeViewSet.delete_relation(request, pk, ShoppingCart)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=[IsAuthenticated, ]
+    )
+    def shopping_cart_bulk(self, request):
+        """Несколько рецептов в список покупок или из него за раз."""
+        return change_relations(request, ShoppingCart, Recipe.objects)
+
+    @action(
+        detail=False,
+        methods=['DELETE'],
+        url_path='shopping_cart/clear',
+        url_name='shopping-cart-clear',
+        permission_classes=[IsAuthenticated, ]
+    )
+    def clear_shopping_cart(self, request):
+        """Очистить список покупок."""
+        deleted = ShoppingCart.objects.remove_many(request.user.id)
+        for pk in deleted:
+            get_relation_sets(request).discard(ShoppingCart, pk)
+        return Response({'results': [
+            {'id': pk, 'status': 'deleted'} for pk in sorted(deleted)
+        ]})
+
     @action(
         detail=True,
         methods=['POST'],
@@ -130,29 +262,105 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def unfavorite(self, request, pk):
         return RecipeViewSet.delete_relation(request, pk, Favorite)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=[IsAuthenticated, ]
+    )
+    def favorite_bulk(self, request):
+        """Несколько рецептов в избранное или из него за раз."""
+        return change_relations(request, Favorite, Recipe.objects)
+
+    @action(
+        detail=True,
+        methods=['PUT'],
+        permission_classes=[IsAuthenticated, IsAuthorOrAdminOrReadOnly],
+        parser_classes=[MultiPartParser, FileUploadParser]
+    )
+    def image(self, request, pk):
+        """Загрузить картинку файлом: multipart (поле image) или телом.
+
+        Файл пишется на диск по частям, копии строятся в фоне.
+        """
+        check_content_length(request)
+        recipe = self.get_object()
+        # Тело ещё не прочитано: файл пойдёт на диск с проверкой лимита.
+        request._request.upload_handlers = [
+            LimitedUploadHandler(request._request)]
+        # Только файлы: текстовое поле image= не должно стать путём.
+        upload = request.FILES.get('image') or request.FILES.get('file')
+        if not isinstance(upload, UploadedFile):
+            return Response(
+                {'image': 'Загрузите файл изображения.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            name = validate_image_upload(upload)
+            with transaction.atomic():
+                recipe.image.save(name, upload, save=False)
+                recipe.save(update_fields=['image', 'update'])
+        finally:
+            # Временный файл уже перенесён хранилищем или не нужен.
+            upload.close()
+        serializer = RecipeReadSerializer(
+            recipe, context=self.get_serializer_context())
+        return Response(serializer.data)
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Стандартный ридонли вьюсет тегов модели Tag."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny, ]
+    query_budgets = {'list': 2, 'retrieve': 2}
+    cache_control = settings.CATALOG_CACHE_CONTROL
+
+    def get_versions(self, request):
+        return get_versions([TAGS_VERSION_KEY])
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Стандартный ридонли вьюсет ингридиентов модели Ingredient."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
     permission_classes = [AllowAny, ]
+    query_budgets = {'list': 1, 'retrieve': 2}
+    cache_control = settings.CATALOG_CACHE_CONTROL
+
+    def get_versions(self, request):
+        return get_versions([INDEX_VERSION_KEY])
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.search, request)
+
+    def search(self, request):
+        """Поиск ?name= по индексу в памяти, без запросов к БД."""
+        index = get_ingredient_index()
+        name = request.query_params.get('name')
+        if name is None:
+            return Response(index.rows)
+        limit = request.query_params.get('limit', '')
+        limit = int(limit) if limit.isdigit() and int(limit) > 0 else (
+            settings.INGREDIENT_SEARCH_LIMIT)
+        return Response(index.search(name, limit))
 
 
-class FoodgramUserViewSet(UserViewSet):
+class FoodgramUserViewSet(SparseFieldsViewMixin, UserViewSet):
     """Кастомный ViewSet модели User."""
     queryset = User.objects.all()
     permission_classes = [AllowAny, ]
     filter_backends = [DjangoFilterBackend]
     pagination_class = StandartPagination
+    cursor_ordering = ('username', 'id')
+    sparse_actions = ('list', 'retrieve', 'me', 'subscriptions')
+    query_budgets = {
+        'list': 9,
+        'retrieve': 3,
+        'me': 2,
+        'subscriptions': 10,
+    }
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve', 'me'):
@@ -163,6 +371,21 @@ class FoodgramUserViewSet(UserViewSet):
             return SubscriptionSerializer
         return UserCreateSerializer  # есть аналогичный из djoser
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only(*self.get_read_columns())
+        return queryset
+
+    def get_read_columns(self):
+        """Колонки пользователя, которые нужны ответу и пагинации."""
+        selection = self.get_field_selection()
+        columns = ['id', 'username']
+        for name in ('email', 'first_name', 'last_name', 'recipes_count'):
+            if name in (selection or self.get_serializer_class().Meta.fields):
+                columns.append(name)
+        return columns
+
     @action(
         detail=False,
         methods=['GET', ],
@@ -173,35 +396,58 @@ class FoodgramUserViewSet(UserViewSet):
         user = request.user
         subscriptions = User.objects.filter(
             following__user=user
-        )
+        ).only(*self.get_read_columns())
+        recipes_limit = get_recipes_limit(request)
         page = self.paginate_queryset(subscriptions)
+        selection = self.get_field_selection()
+        if selection is None or 'recipes' in selection:
+            recipes = Recipe.objects.order_by('-pub_date', '-id')
+            if recipes_limit is not None:
+                recipes = recipes.latest_per_author(
+                    [author.id for author in page], recipes_limit)
+            prefetch_related_objects(page, Prefetch(
+                'recipes', queryset=recipes, to_attr='limited_recipes'))
         serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='subscribe',
+        url_name='subscribe-bulk',
+        permission_classes=[IsAuthenticated, ]
+    )
+    def subscribe_bulk(self, request):
+        """Подписаться на несколько авторов или отписаться за раз."""
+        # На себя подписаться нельзя: свой id вернётся как not_found.
+        return change_relations(
+            request, Subscribe, User.objects.exclude(pk=request.user.pk))
+
     @action(
         detail=True,
         methods=['POST'],
-        permission_classes=[IsAuthorOrAdminOrReadOnly]
+        permission_classes=[IsAuthenticated, ]
     )
     def subscribe(self, request, id):
         """Функционал подписок на авторов."""
-        user = request.user
-        author = get_object_or_404(User, pk=id)
-        data = {
-            'user': user.pk,
-            'author': author.pk
-        }
-        serializer = SubscribeSerializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        serializer = self.get_serializer(author)
+        id = url_pk(id)
+        if id == request.user.pk:
+            raise ValidationError({'error': [SUBSCRIBE_SELF_MESSAGE]})
+        if not Subscribe.objects.add_many(request.user.pk, [id]):
+            get_object_or_404(User.objects.only('id'), pk=id)
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                RELATION_EXISTS_MESSAGES[Subscribe]]})
+        get_relation_sets(request).add(Subscribe, id)
+        serializer = self.get_serializer(get_object_or_404(User, pk=id))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def unsubscribe(self, request, id):
-        author = get_object_or_404(User, id=id)
-        user = request.user
-        get_object_or_404(Subscribe, user=user, author=author).delete()
+        id = url_pk(id)
+        if not Subscribe.objects.remove_many(request.user.pk, [id]):
+            raise Http404
+        get_relation_sets(request).discard(Subscribe, id)
+        author = User.objects.only('username').get(pk=id)
         message = {
             'detail': f'Вы отписались от пользователя {author}'
         }
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -22,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'jobs',
     'recipes',
     'users',
     'api',
@@ -29,20 +31,43 @@ INSTALLED_APPS = [
     'django_filters'
 ]
 
+# Basic-аутентификация проверяет пароль (PBKDF2) на каждом запросе.
+API_BASIC_AUTH = os.getenv('API_BASIC_AUTH', 'True') == 'True'
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         # 'rest_framework.authentication.SessionAuthentication',
+    ] + (
+        ['api.authentication.ThrottledBasicAuthentication']
+        if API_BASIC_AUTH else []
+    ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'basic_auth': os.getenv('BASIC_AUTH_RATE', '30/min'),
+        'basic_auth_failures': os.getenv('BASIC_AUTH_FAILURE_RATE', '10/min'),
+    },
+    # Перед бэкендом один nginx: адрес клиента — последний в
+    # X-Forwarded-For, подставленные клиентом адреса левее игнорируются.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
 }
+
+AUTH_TOKEN_CACHE_TIMEOUT = 60
 APPEND_SLASH = False
 
 DJOSER = {
@@ -66,8 +91,15 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.QueryInspectMiddleware',
 ]
 
+QUERY_INSPECT_ENABLED = os.getenv('QUERY_INSPECT_ENABLED', 'False') == 'True'
+
+QUERY_INSPECT_SLOWEST = 3
+
+QUERY_INSPECT_SQL_LENGTH = 200
+
 ROOT_URLCONF = 'backend.urls'
 
 WSGI_APPLICATION = 'backend.wsgi.application'
@@ -83,6 +115,35 @@ DATABASES = {
     }
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Тестовая база в файле: SQLite в общей памяти блокирует таблицы без
+    # ожидания, и тесты с потоками (api.tests) падали бы на блокировках.
+    DATABASES['default']['TEST'] = {
+        'NAME': os.path.join(tempfile.gettempdir(), 'foodgram_test.sqlite3'),
+    }
+    DATABASES['default']['OPTIONS'] = {'timeout': 20}
+
+# default — общий кэш процессов web, run_worker и management-команд:
+# ключи-версии (ETag, поколения кэша рецептов), токены, троттлинг. В
+# docker-compose каталог — том, общий для контейнеров backend и worker.
+# local — память процесса для объёмных записей (фрагменты рецептов,
+# ответы анонимам): их ключи включают общие версии и не устаревают.
+# Тесты и запуск в одном процессе: CACHE_BACKEND=...locmem.LocMemCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -134,6 +195,63 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_INDEX_TTL = 300
+
+INGREDIENT_INDEX_SIMILARITY = 0.3
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+RECIPES_CACHE_TIMEOUT = 300
+
+RECIPES_CACHE_LOCK_TIMEOUT = 5
+
+RECIPES_CACHE_POLL_INTERVAL = 0.02
+
+# Теги и ингредиенты меняются редко: браузер и nginx держат их минуту,
+# затем перепроверяют по ETag.
+CATALOG_CACHE_CONTROL = 'public, max-age=60'
+
+RECIPE_FRAGMENT_CACHE = True
+
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Ширины уменьшенных копий картинок рецептов и параметры форматов.
+RECIPE_IMAGE_VARIANTS = {'thumbnail': 160, 'card': 480}
+
+RECIPE_IMAGE_FORMATS = {
+    'webp': {'quality': 80, 'method': 4},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+# Загрузка картинки файлом: PUT /api/recipes/{id}/image/.
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+
+RECIPE_IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+# Очередь фоновых задач (jobs): JOBS_SYNC выполняет задачи сразу при
+# постановке в том же процессе, без воркера — для тестов и разработки.
+JOBS_SYNC = os.getenv('JOBS_SYNC', 'False') == 'True'
+
+JOBS_BACKOFF_BASE = 10
+
+JOBS_BACKOFF_MAX = 60 * 60
+
+# Задача, взятая раньше этого срока (секунды), считается брошенной.
+JOBS_LOCK_TIMEOUT = 15 * 60
+
+# Сколько id принимают пачечные избранное, корзина и подписки.
+RELATIONS_BULK_MAX = 100
+
+# Чтение рецептов без полей DRF (RecipeReadSerializer.represent_fast).
+FAST_READ_SERIALIZERS = os.getenv('FAST_READ_SERIALIZERS', 'True') == 'True'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
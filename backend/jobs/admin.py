@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'priority',
+        'attempts',
+        'run_at',
+        'finished_at',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    readonly_fields = ('last_error',)
+
+
+admin.site.register(Job, JobAdmin)
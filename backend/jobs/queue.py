@@ -0,0 +1,122 @@
+import json
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    """Зарегистрированная функция, которую можно поставить в очередь."""
+
+    def __init__(self, func, priority, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def enqueue(self, priority=None, delay=0, **kwargs):
+        """Поставить задачу в очередь в текущей транзакции.
+
+        Строка задачи коммитится вместе с данными, поэтому воркер не
+        увидит задачу об объекте, который ещё не сохранён. С JOBS_SYNC
+        задача выполняется сразу, в этом же процессе и транзакции: так
+        она работает и в TestCase, где коммита не бывает. Аргументы, как
+        у воркера, проходят через JSON: несериализуемые падают и здесь.
+        """
+        if settings.JOBS_SYNC:
+            self.func(**json.loads(json.dumps(kwargs)))
+            return None
+        return Job.objects.create(
+            name=self.name,
+            kwargs=kwargs,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+
+def job(priority=0, max_attempts=5):
+    """Декоратор задачи: @job(priority=10) def build(recipe_id): ..."""
+    def register(func):
+        task = Task(func, priority, max_attempts)
+        registry[task.name] = task
+        return task
+    return register
+
+
+def backoff(attempts):
+    """Пауза перед повтором: экспонента с потолком и разбросом."""
+    delay = min(
+        settings.JOBS_BACKOFF_BASE * 2 ** (attempts - 1),
+        settings.JOBS_BACKOFF_MAX
+    )
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def release_stale():
+    """Вернуть в очередь задачи упавших воркеров."""
+    return Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS_LOCK_TIMEOUT)
+    ).update(status=Job.PENDING, locked_at=None)
+
+
+def claim(names=None):
+    """Взять следующую задачу: SELECT ... FOR UPDATE SKIP LOCKED.
+
+    Строки, заблокированные другими воркерами, пропускаются, поэтому
+    воркеры не ждут друг друга и не берут одну задачу дважды.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.PENDING, run_at__lte=now)
+        if names:
+            jobs = jobs.filter(name__in=names)
+        claimed = jobs.order_by('-priority', 'run_at', 'id').first()
+        if claimed is not None:
+            claimed.status = Job.RUNNING
+            claimed.attempts += 1
+            claimed.locked_at = now
+            claimed.save(update_fields=['status', 'attempts', 'locked_at'])
+    return claimed
+
+
+def run(claimed):
+    """Выполнить взятую задачу и записать результат или повтор."""
+    task = registry.get(claimed.name)
+    try:
+        if task is None:
+            raise LookupError(f'Задача {claimed.name} не зарегистрирована.')
+        task.func(**claimed.kwargs)
+    except Exception:
+        logger.exception('Задача %s упала', claimed)
+        claimed.last_error = traceback.format_exc()
+        if claimed.attempts >= claimed.max_attempts:
+            claimed.status = Job.FAILED
+            claimed.finished_at = timezone.now()
+        else:
+            claimed.status = Job.PENDING
+            claimed.run_at = timezone.now() + backoff(claimed.attempts)
+    else:
+        claimed.status = Job.DONE
+        claimed.finished_at = timezone.now()
+    claimed.locked_at = None
+    claimed.save(update_fields=[
+        'status', 'run_at', 'locked_at', 'finished_at', 'last_error'])
+    return claimed.status
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.test import TestCase, override_settings
+
+from .models import Job
+from .queue import job
+
+calls = []
+
+
+@job()
+def remember(value):
+    calls.append(value)
+
+
+class EnqueueTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_queued(self):
+        created = remember.enqueue(value=[1, 2])
+        self.assertEqual(Job.objects.get().pk, created.pk)
+        self.assertEqual(created.name, 'jobs.tests.remember')
+        self.assertEqual(calls, [])
+
+    @override_settings(JOBS_SYNC=True)
+    def test_sync_runs_now(self):
+        # Кортеж приходит списком, как из строки задачи у воркера.
+        self.assertIsNone(remember.enqueue(value=(1, 2)))
+        self.assertEqual(calls, [[1, 2]])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_SYNC=True)
+    def test_sync_rejects_unserializable(self):
+        with self.assertRaises(TypeError):
+            remember.enqueue(value=date.today())
+        self.assertEqual(calls, [])
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 
-from .models import Favorite, Ingredient, IngredientInRecipe, Recipe, Tag
+from .models import Ingredient, IngredientInRecipe, Recipe, Tag
 
 
 class IngredientInRecipeInLine(admin.StackedInline):
@@ -15,7 +15,7 @@ class RecipeAdmin(admin.ModelAdmin):
 
     # @admin.display(description='В избранном')
     def favorited_count(self):
-        return Favorite.objects.filter(recipe=self.id).count()
+        return self.favorites_count
 
     # @admin.display(description='Ингредиенты')
     def ingredient_in_recipe(self):
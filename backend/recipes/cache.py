@@ -0,0 +1,58 @@
+import time
+
+from django.core.cache import cache
+
+EPOCH_KEY = 'recipes:epoch'
+ALL_KEY = 'recipes:generation:all'
+TAG_KEY = 'recipes:generation:tag:{}'
+USER_KEY = 'recipes:generation:user:{}'
+TAGS_VERSION_KEY = 'tags:version'
+
+
+def get_versions(keys):
+    """Значения ключей-версий (time_ns последнего изменения).
+
+    Отсутствующий ключ (в том числе вытесненный из кэша) создаётся с
+    новым значением, чтобы старые записи не ожили.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(key):
+    cache.set(key, time.time_ns(), None)
+
+
+def get_generations(tag_slugs=()):
+    """Поколения кэша рецептов: общее или по каждому тегу из фильтра."""
+    return get_versions([EPOCH_KEY] + (
+        [TAG_KEY.format(slug) for slug in sorted(set(tag_slugs))]
+        or [ALL_KEY]
+    ))
+
+
+def get_epoch():
+    """Эпоха кэша рецептов: меняется при изменениях, задевающих всё."""
+    return get_generations()[0]
+
+
+def bump_generations(tag_slugs=()):
+    """Сбросить кэш списков без фильтра и с фильтром по этим тегам."""
+    value = time.time_ns()
+    cache.set_many(
+        {TAG_KEY.format(slug): value for slug in tag_slugs}, None)
+    cache.set(ALL_KEY, value, None)
+
+
+def bump_epoch():
+    """Сбросить весь кэш рецептов."""
+    bump_version(EPOCH_KEY)
+
+
+def bump_user_generation(user_id):
+    """Изменились избранное, корзина или подписки пользователя."""
+    bump_version(USER_KEY.format(user_id))
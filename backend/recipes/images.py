@@ -0,0 +1,89 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+VARIANTS_DIR = 'recipes/image/variants'
+
+
+def render_variants(image_file):
+    """Уменьшенные копии: {формат: [(имя, ширина, байты), ...]}.
+
+    Ширины берутся из RECIPE_IMAGE_VARIANTS, картинка не увеличивается.
+    """
+    rendered = {fmt: [] for fmt in settings.RECIPE_IMAGE_FORMATS}
+    with Image.open(image_file) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    for variant, width in settings.RECIPE_IMAGE_VARIANTS.items():
+        resized = image
+        if image.width > width:
+            resized = image.resize(
+                (width, round(image.height * width / image.width)),
+                Image.LANCZOS
+            )
+        for fmt, options in settings.RECIPE_IMAGE_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, fmt, **options)
+            rendered[fmt].append((variant, resized.width, buffer.getvalue()))
+    return rendered
+
+
+def delete_variant_files(storage, variants):
+    for fmt, items in variants.items():
+        if fmt != 'source':
+            for name, _ in items:
+                storage.delete(name)
+
+
+def build_variants(recipe_id):
+    """Сделать копии изображения рецепта и сохранить их в image_variants.
+
+    Если картинку успели заменить, результат выбрасывается: копии для
+    новой картинки построит следующая задача.
+    """
+    recipe = Recipe.objects.only('image').filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    storage = recipe.image.storage
+    with recipe.image.open('rb') as image_file:
+        rendered = render_variants(image_file)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = {'source': source}
+    for fmt, items in rendered.items():
+        variants[fmt] = [
+            [storage.save(
+                f'{VARIANTS_DIR}/{stem}_{variant}.{fmt}', ContentFile(data)
+            ), width]
+            for variant, width, data in items
+        ]
+    with transaction.atomic():
+        current = Recipe.objects.select_for_update().only(
+            'image', 'image_variants').filter(pk=recipe_id).first()
+        if current is None or current.image.name != source:
+            stale = variants
+        else:
+            stale = current.image_variants
+            current.image_variants = variants
+            current.save(update_fields=['image_variants', 'update'])
+    delete_variant_files(storage, stale)
+
+
+def image_srcset(recipe, build_uri):
+    """srcset по форматам или None, пока копии текущей картинки не готовы."""
+    variants = recipe.image_variants
+    if not recipe.image or variants.get('source') != recipe.image.name:
+        return None
+    storage = recipe.image.storage
+    return {
+        fmt: ', '.join(
+            f'{build_uri(storage.url(name))} {width}w'
+            for name, width in variants[fmt]
+        )
+        for fmt in settings.RECIPE_IMAGE_FORMATS if fmt in variants
+    }
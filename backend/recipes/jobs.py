@@ -0,0 +1,9 @@
+from jobs.queue import job
+
+from .images import build_variants
+
+
+@job(priority=10)
+def build_image_variants(recipe_id):
+    """Уменьшенные копии картинки рецепта."""
+    build_variants(recipe_id)
@@ -1,11 +1,115 @@
 from django.conf import settings
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef,
+                              Prefetch, Value, When)
+from django.db.models.expressions import RawSQL
+from django.dispatch import Signal
 
-from users.models import User
+from users.models import CountersSaveMixin, User
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Кастомный QuerySet рецептов."""
+
+    user_flags = (
+        'is_favorited', 'is_in_shopping_cart', 'author_is_subscribed')
+    # Поле ответа -> колонки, которые не читаются без этого поля.
+    read_columns = {
+        'name': ('name',),
+        'image': ('image',),
+        'image_srcset': ('image', 'image_variants'),
+        'text': ('text',),
+        'cooking_time': ('cooking_time',),
+    }
+
+    def with_user_flags(self, user, flags=user_flags):
+        """Аннотировать флаги избранного, корзины и подписки на автора."""
+        if not user.is_authenticated:
+            annotations = {flag: Value(False) for flag in flags}
+        else:
+            annotations = {
+                'is_favorited': Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                'author_is_subscribed': Exists(Subscribe.objects.filter(
+                    user=user, author=OuterRef('author'))),
+            }
+        return self.annotate(
+            **{flag: annotations[flag] for flag in flags})
+
+    @staticmethod
+    def read_prefetches(fields=None):
+        """Связи, которые нужны RecipeReadSerializer."""
+        prefetches = []
+        if fields is None or 'tags' in fields:
+            prefetches.append('tags')
+        if fields is None or 'ingredients' in fields:
+            prefetches.append(Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredients').order_by('ingredients__name')
+            ))
+        return prefetches
+
+    def for_read(self, user, prefetch=True, fields=None):
+        """Рецепты для чтения: фиксированное число запросов на страницу.
+
+        prefetch=False оставляет загрузку связей сериализатору (для
+        рецептов, которых нет в кэше фрагментов). fields — нужные части
+        рецепта (связи, флаги, колонки); None — все. Остальные не
+        аннотируются, не загружаются и откладываются через defer().
+        """
+        if fields is None:
+            fields = (
+                'author', 'tags', 'ingredients',
+                *self.user_flags, *self.read_columns
+            )
+        queryset = self.with_user_flags(user, [
+            flag for flag in self.user_flags if flag in fields])
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if prefetch:
+            queryset = queryset.prefetch_related(
+                *self.read_prefetches(fields))
+        needed = {
+            column for name in fields
+            for column in self.read_columns.get(name, ())
+        }
+        deferred = {
+            column for columns in self.read_columns.values()
+            for column in columns if column not in needed
+        }
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
+    def latest_per_author(self, author_ids, limit):
+        """Не больше limit последних рецептов каждого автора одним запросом.
+
+        ROW_NUMBER() OVER (PARTITION BY author_id ...) считается только
+        по рецептам переданных авторов.
+        """
+        author_ids = list(author_ids)
+        if not author_ids:
+            return self.none()
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        ranked = RawSQL(
+            f'SELECT id FROM ('
+            f'SELECT id, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS row_number FROM {self.model._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})'
+            f') AS ranked WHERE row_number <= %s',
+            (*author_ids, limit)
+        )
+        return self.filter(pk__in=ranked)
+
+
+class Recipe(CountersSaveMixin, models.Model):
+    counter_fields = ('favorites_count', 'shopping_carts_count')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -50,11 +154,34 @@ class Recipe(models.Model):
         auto_now=True,
         verbose_name='Дата обновления'
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False
+    )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -144,7 +271,81 @@ class IngredientInRecipe(models.Model):
         return f'{self.ingredients}: {self.amount}'
 
 
+# Связи добавлены или удалены пачкой, без post_save/post_delete:
+# sender — модель связи, user_id, pks — id объектов, created.
+relations_changed = Signal()
+
+
+class RelationQuerySet(models.QuerySet):
+    """Связи пользователя с рецептами или авторами, пачкой за раз.
+
+    Поле объекта связи задаётся атрибутом модели target_field. Вставка и
+    удаление — по одному запросу (ON CONFLICT DO NOTHING и RETURNING,
+    PostgreSQL и SQLite 3.35+): повторный клик или гонка двух запросов
+    не дают IntegrityError, а созданные и удалённые связи видны по
+    возвращённым строкам.
+    """
+
+    def relation_sql(self, sql, params):
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def add_many(self, user_id, pks, targets=None):
+        """Создать связи с pks; вернуть id объектов новых связей.
+
+        Связи создаются только с объектами из targets (по умолчанию все
+        объекты модели), несуществующие id пропускаются.
+        """
+        meta = self.model._meta
+        field = meta.get_field(self.model.target_field)
+        if targets is None:
+            targets = field.related_model.objects.all()
+        if not pks:
+            return set()
+        select, params = targets.filter(
+            pk__in=pks).values('pk').query.sql_with_params()
+        quote = connections[self.db].ops.quote_name
+        column = quote(field.column)
+        with transaction.atomic(using=self.db):
+            created = self.relation_sql(
+                f'INSERT INTO {quote(meta.db_table)} '
+                f'({quote(meta.get_field("user").column)}, {column}) '
+                f'SELECT %s, target.* FROM ({select}) AS target WHERE true '
+                f'ON CONFLICT DO NOTHING RETURNING {column}',
+                (user_id, *params)
+            )
+            if created:
+                relations_changed.send(
+                    sender=self.model, user_id=user_id, pks=created,
+                    created=True)
+        return created
+
+    def remove_many(self, user_id, pks=None):
+        """Удалить связи с pks (None — все); вернуть id удалённых."""
+        meta = self.model._meta
+        quote = connections[self.db].ops.quote_name
+        column = quote(meta.get_field(self.model.target_field).column)
+        sql = (f'DELETE FROM {quote(meta.db_table)} '
+               f'WHERE {quote(meta.get_field("user").column)} = %s')
+        params = [user_id]
+        if pks is not None:
+            if not pks:
+                return set()
+            sql += f' AND {column} IN ({", ".join(["%s"] * len(pks))})'
+            params += list(pks)
+        with transaction.atomic(using=self.db):
+            removed = self.relation_sql(f'{sql} RETURNING {column}', params)
+            if removed:
+                relations_changed.send(
+                    sender=self.model, user_id=user_id, pks=removed,
+                    created=False)
+        return removed
+
+
 class Subscribe(models.Model):
+    target_field = 'author_id'
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -158,6 +359,8 @@ class Subscribe(models.Model):
         verbose_name='Автор'
     )
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписки'
         constraints = [
@@ -168,6 +371,8 @@ class Subscribe(models.Model):
 
 class AbstractModel(models.Model):
     """Abstract model for Favorite and ShoppingCart"""
+    target_field = 'recipe_id'
+
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
@@ -179,6 +384,8 @@ class AbstractModel(models.Model):
         verbose_name='Пользователь'
     )
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         abstract = True
 
@@ -211,3 +418,73 @@ class ShoppingCart(AbstractModel):
             ),
         ]
         default_related_name = 'recipes_shoppingcart_related'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """Кастомный QuerySet сводного списка покупок."""
+
+    @staticmethod
+    def recipe_amounts(recipe_ids):
+        """Сумма ингредиентов рецептов: {ingredient_id: amount}."""
+        amounts = {}
+        for ingredient_id, amount in IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+        ).values_list('ingredients_id', 'amount'):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+        return amounts
+
+    def apply(self, user_ids, amounts):
+        """Прибавить amounts {ingredient_id: delta} к спискам пользователей."""
+        amounts = {
+            ingredient_id: delta
+            for ingredient_id, delta in amounts.items() if delta
+        }
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            self.bulk_create([
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=0)
+                for user_id in user_ids for ingredient_id in amounts
+            ], ignore_conflicts=True)
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=amounts
+            ).update(amount=F('amount') + Case(
+                *[When(ingredient_id=ingredient_id, then=Value(delta))
+                  for ingredient_id, delta in amounts.items()],
+                output_field=IntegerField()
+            ))
+            self.filter(user_id__in=user_ids, amount__lte=0).delete()
+
+
+class ShoppingListItem(models.Model):
+    """Сводный список покупок: сумма ингредиентов рецептов из корзины."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+        default_related_name = 'shopping_list'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_shopping_list_item',
+                fields=['user', 'ingredient'],
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.amount}'
@@ -0,0 +1,98 @@
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .cache import bump_version, get_versions
+from .models import Ingredient
+
+INDEX_VERSION_KEY = 'ingredient_index_version'
+
+
+def trigrams(text):
+    """Триграммы в стиле pg_trgm: каждое слово дополняется пробелами."""
+    result = set()
+    for word in text.split():
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов по названию в нижнем регистре.
+
+    Префиксный поиск — бинарный поиск по отсортированному списку,
+    опечатки добираются по таблице триграмм.
+    """
+
+    def __init__(self, rows):
+        self.rows = sorted(
+            rows, key=lambda row: (row['name'].casefold(), row['id']))
+        self.keys = [row['name'].casefold() for row in self.rows]
+        self.trigrams = defaultdict(list)
+        self.sizes = []
+        for position, key in enumerate(self.keys):
+            key_trigrams = trigrams(key)
+            self.sizes.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                self.trigrams[trigram].append(position)
+
+    def prefix(self, query, limit):
+        positions = []
+        position = bisect_left(self.keys, query)
+        while (position < len(self.keys) and len(positions) < limit
+               and self.keys[position].startswith(query)):
+            positions.append(position)
+            position += 1
+        return positions
+
+    def fuzzy(self, query, limit, exclude):
+        query_trigrams = trigrams(query)
+        shared = Counter(
+            position
+            for trigram in query_trigrams
+            for position in self.trigrams.get(trigram, ())
+        )
+        ranked = []
+        for position, count in shared.items():
+            if position in exclude:
+                continue
+            similarity = count / (
+                len(query_trigrams) + self.sizes[position] - count)
+            if similarity >= settings.INGREDIENT_INDEX_SIMILARITY:
+                ranked.append((-similarity, self.keys[position], position))
+        ranked.sort()
+        return [position for _, _, position in ranked[:limit]]
+
+    def search(self, query, limit):
+        """Сначала совпадения по префиксу, затем похожие по триграммам."""
+        query = ' '.join(query.casefold().split())
+        positions = self.prefix(query, limit)
+        if query and len(positions) < limit:
+            positions += self.fuzzy(
+                query, limit - len(positions), set(positions))
+        return [self.rows[position] for position in positions]
+
+
+_state = (None, None, 0.0)
+
+
+def get_ingredient_index():
+    """Индекс текущего процесса; перестраивается при смене версии или TTL."""
+    global _state
+    index, version, built_at = _state
+    current, = get_versions([INDEX_VERSION_KEY])
+    if (index is None or version != current
+            or time.monotonic() - built_at > settings.INGREDIENT_INDEX_TTL):
+        index = IngredientIndex(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'))
+        _state = (index, current, time.monotonic())
+    return index
+
+
+def invalidate_ingredient_index():
+    """Сменить версию индекса, чтобы все процессы перестроили его."""
+    global _state
+    bump_version(INDEX_VERSION_KEY)
+    _state = (None, None, 0.0)
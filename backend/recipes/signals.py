@@ -0,0 +1,185 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from users.models import User
+from .cache import (TAGS_VERSION_KEY, bump_epoch, bump_generations,
+                    bump_user_generation, bump_version)
+from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, ShoppingListItem, Subscribe, Tag,
+                     relations_changed)
+from .images import delete_variant_files
+from .jobs import build_image_variants
+from .search import invalidate_ingredient_index
+
+
+def change_counter(model, pks, field, delta):
+    """Атомарно изменить счётчики через F(): без чтения строк."""
+    counters = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        # Счётчик не уходит в минус, даже если разошёлся с данными.
+        counters = counters.filter(**{f'{field}__gte': -delta})
+    counters.update(**{field: F(field) + delta})
+
+
+COUNTERS = {
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'shopping_carts_count'),
+    Subscribe: (User, 'author_id', 'subscribers_count'),
+}
+
+
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        model, attname, field = COUNTERS[sender]
+        change_counter(model, [getattr(instance, attname)], field, 1)
+
+
+def decrement_counter(sender, instance, **kwargs):
+    model, attname, field = COUNTERS[sender]
+    change_counter(model, [getattr(instance, attname)], field, -1)
+
+
+for counted_model in COUNTERS:
+    post_save.connect(increment_counter, sender=counted_model)
+    post_delete.connect(decrement_counter, sender=counted_model)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.apply(
+            [instance.user_id],
+            ShoppingListItem.objects.recipe_amounts([instance.recipe_id])
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты ещё в базе.
+    amounts = ShoppingListItem.objects.recipe_amounts([instance.recipe_id])
+    ShoppingListItem.objects.apply(
+        [instance.user_id],
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()}
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    invalidate_ingredient_index()
+    transaction.on_commit(bump_epoch)
+
+
+def bump_recipe_cache(recipe_id=None, tag_slugs=()):
+    """Сбросить кэш ответов с рецептом после коммита транзакции."""
+    slugs = set(tag_slugs)
+    if recipe_id is not None:
+        slugs.update(Tag.objects.filter(
+            recipe=recipe_id).values_list('slug', flat=True))
+    transaction.on_commit(lambda: bump_generations(slugs))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_recipe_cache(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if (instance.image
+            and instance.image_variants.get('source') != instance.image.name):
+        build_image_variants.enqueue(recipe_id=instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    storage, variants = instance.image.storage, instance.image_variants
+    transaction.on_commit(lambda: delete_variant_files(storage, variants))
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    bump_recipe_cache(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove'):
+        return
+    if reverse:
+        bump_recipe_cache(tag_slugs=[instance.slug])
+    elif action == 'pre_clear':
+        bump_recipe_cache(instance.pk)
+    else:
+        bump_recipe_cache(tag_slugs=Tag.objects.filter(
+            pk__in=pk_set).values_list('slug', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    transaction.on_commit(bump_epoch)
+    transaction.on_commit(lambda: bump_version(TAGS_VERSION_KEY))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def user_relation_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_user_generation(instance.user_id))
+
+
+@receiver(relations_changed)
+def relations_changed_in_bulk(sender, user_id, pks, created, **kwargs):
+    """То же, что счётчики, список покупок и кэш выше, но на всю пачку."""
+    model, _, field = COUNTERS[sender]
+    change_counter(model, pks, field, 1 if created else -1)
+    if sender is ShoppingCart:
+        amounts = ShoppingListItem.objects.recipe_amounts(pks)
+        if not created:
+            amounts = {
+                ingredient_id: -amount
+                for ingredient_id, amount in amounts.items()
+            }
+        ShoppingListItem.objects.apply([user_id], amounts)
+    transaction.on_commit(lambda: bump_user_generation(user_id))
+
+
+# Поля автора, которые выводятся внутри рецептов.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def author_snapshot(sender, instance, update_fields=None, **kwargs):
+    """Запомнить, меняются ли поля автора, видимые в рецептах.
+
+    Регистрация, вход и смена пароля кэш рецептов не сбрасывают: новый
+    пользователь и пользователь без рецептов в ответах не встречается.
+    """
+    instance._author_changed = False
+    fields = AUTHOR_FIELDS
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    if instance._state.adding or not fields:
+        return
+    old = User.objects.filter(
+        pk=instance.pk, recipes_count__gt=0).values(*fields).first()
+    instance._author_changed = old is not None and any(
+        old[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_author_changed', False):
+        transaction.on_commit(bump_epoch)
@@ -7,10 +7,10 @@ from .models import User
 class UserAdmin(UserAdmin):
 
     def subscriptions_count(self, user):
-        return user.following.count()
+        return user.subscribers_count
 
     def recipes_count(self, user):
-        return user.recipes.count()
+        return user.recipes_count
 
     subscriptions_count.short_description = 'Подписок'
     recipes_count.short_description = 'Рецептов'
@@ -0,0 +1,23 @@
+import hashlib
+
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+TOKEN_KEY = 'auth:token:{}'
+
+
+def token_cache_key(key):
+    """Ключ снимка пользователя; сам токен в кэш не попадает."""
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def forget_token(key):
+    cache.delete(token_cache_key(key))
+
+
+def forget_user_tokens(user_id):
+    """Сбросить снимки пользователя по всем его токенам."""
+    cache.delete_many([
+        token_cache_key(key) for key in Token.objects.filter(
+            user_id=user_id).values_list('key', flat=True)
+    ])
@@ -4,10 +4,36 @@ from django.core.validators import RegexValidator
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersSaveMixin:
+    """save() не пишет counter_fields: они меняются только через F().
+
+    Полный save() устаревшего экземпляра (пользователь из кэша токенов,
+    рецепт из get_object()) иначе затёр бы прибавки других запросов.
+    """
+    counter_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert'):
+            if update_fields is None:
+                # Как в Model.save(): отложенные поля тоже не пишутся.
+                skipped = self.get_deferred_fields()
+                update_fields = [
+                    field.attname for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and field.attname not in skipped
+                ]
+            update_fields = [
+                name for name in update_fields
+                if name not in self.counter_fields
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class User(CountersSaveMixin, AbstractUser):
     """Модель создания пользователя."""
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     username = models.CharField(
         max_length=settings.MAX_LENGTH_USERNAME,
@@ -33,6 +59,16 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('username',)
@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .cache import forget_token, forget_user_tokens
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Выход (djoser logout) удаляет токен.
+    transaction.on_commit(lambda: forget_token(instance.key))
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Смена пароля, деактивация и правка профиля меняют снимок.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        transaction.on_commit(lambda: forget_user_tokens(instance.pk))